@@ -0,0 +1,55 @@
+import importlib
+from types import ModuleType
+
+# Data source name -> module implementing the dataset plugin interface.
+# Modules are only imported when their data source is used, so unused sources add nothing to startup time.
+#
+# A plugin module provides:
+#   load_options(data_config, time_series_config) -> dict         extra keyword arguments for `get_combined_dataset`
+#   filter_data(data, data_config)                                 filters the loaded Dataset/DataFrame before conversion
+#   to_dataframe(data, data_config, time_series_config)            converts the loaded data to a DataFrame
+#   preprocess_chunk(df, data_config, time_series_config)          row-local preprocessing, keeps the time column
+#   preprocess_df(df, data_config, time_series_config)             full preprocessing including the time index
+#   iter_raw_chunks(data_root, data_config, time_series_config, spill_dir) -> (chunks, chunk_tasks)
+#                                                                  raw chunks of whole groups for chunked preprocessing, and optionally
+#                                                                  a list of small picklable descriptions of the same chunks
+#   read_raw_chunk(task, data_root, data_config, time_series_config) -> DataFrame
+#                                                                  reads the chunk of one task, called in worker processes (only with chunk_tasks)
+#   close_chunk_sources()                                          closes files `read_raw_chunk` keeps open between chunks, called once chunking finishes
+#   create_datasets(df, time_series_config, mode, dataset_parameters=None)
+#                                                                  builds the TimeSeriesDataSets, in eval mode from the fitted training parameters if given
+DATASET_PLUGINS = {
+    'cds': 'datasets.cds.data_handling',
+    'tps_sep22': 'datasets.tps_sep22.data_handling',
+}
+
+def register_dataset(data_source: str, module: str) -> None:
+    """
+    Registers a dataset plugin module for a data source name.
+
+    Parameters:
+    data_source (str): The name used as `data.data_source` in the configuration.
+    module (str): The dotted import path of the plugin module.
+
+    Usage:
+    register_dataset('m5', 'datasets.m5.data_handling')
+    """
+    DATASET_PLUGINS[data_source] = module
+
+def get_dataset_plugin(data_source: str) -> ModuleType:
+    """
+    Imports and returns the plugin module of a data source.
+
+    Parameters:
+    data_source (str): The configured data source name (e.g., 'cds', 'tps_sep22').
+
+    Usage:
+    plugin = get_dataset_plugin(data_config['data_source'])
+    df = plugin.preprocess_df(df, data_config, time_series_config)
+
+    Returns:
+    ModuleType: The plugin module.
+    """
+    if data_source not in DATASET_PLUGINS:
+        raise ValueError(f"[ERROR] Data source {data_source} is not supported. Registered sources: {sorted(DATASET_PLUGINS)}")
+    return importlib.import_module(DATASET_PLUGINS[data_source])
@@ -1,58 +1,251 @@
 import os
-import cdsapi
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List
 
 # https://cds.climate.copernicus.eu/cdsapp#!/dataset/reanalysis-era5-single-levels?tab=overview
 
-# Create a directory to save the files
-save_dir = 'data/vietnam_temp_data'
-# List of selected years
-years = [year for year in range(2000, 2025)]
-# List of selected months
-months = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
-# List of selected days
-days = [
-            '01', '02', '03', '04', '05', '06', '07', '08', '09', '10', 
-            '11', '12', '13', '14', '15', '16', '17', '18', '19', '20', 
-            '21', '22', '23', '24', '25', '26', '27', '28', '29', '30', 
-            '31'
-        ]
-# Time intervals for every 1 hours
-times = [
-            '00:00', '01:00', '02:00',
-            '03:00', '04:00', '05:00',
-            '06:00', '07:00', '08:00',
-            '09:00', '10:00', '11:00',
-            '12:00', '13:00', '14:00',
-            '15:00', '16:00', '17:00',
-            '18:00', '19:00', '20:00',
-            '21:00', '22:00', '23:00',
-        ]
-# List of variables of interest
-variables = [
-    '2m_temperature'
-]
-# lat_x, long_x, lat_y, long_y coordinates for Vietnam
-vietnam_area = [23, 102, 8, 110]
-
-# Make saving directory if it doesn't exist
-os.makedirs(save_dir, exist_ok=True)
-
-# Initialize the CDS API client
-c = cdsapi.Client()
-
-# Loop over each year and retrieve data
-for year in years:
-    c.retrieve(
-        'reanalysis-era5-single-levels',
-        {
-            'product_type': 'reanalysis',
-            'format': 'netcdf',
-            'variable': variables,
-            'year': year,
-            'month': months,
-            'day': days,
-            'time': times,
-            'area': vietnam_area,
-        },
-        os.path.join(save_dir, f'vietnam_cloud_data_{year}.nc')
-    )
\ No newline at end of file
+MONTHS = [f'{month:02d}' for month in range(1, 13)]
+DAYS = [f'{day:02d}' for day in range(1, 32)]
+TIMES = [f'{hour:02d}:00' for hour in range(24)]  # Time intervals for every 1 hour
+
+class LocalCDSClient:
+    """
+    Stand-in for `cdsapi.Client` that serves requests from files in a local directory.
+    It exposes the same `retrieve(name, request, target)` interface, so the downloader can run against it offline or in tests.
+
+    Usage:
+    client = LocalCDSClient('tests/fake_cds', filename_template='vietnam_cloud_data_{year}.nc')
+    client.retrieve('reanalysis-era5-single-levels', {'year': 2001}, 'data/vietnam_cloud_data_2001.nc')
+    """
+    def __init__(self, source_dir: str, filename_template: str):
+        self.source_dir = source_dir
+        self.filename_template = filename_template
+
+    def retrieve(self, name: str, request: dict, target: str) -> None:
+        source_path = os.path.join(self.source_dir, self.filename_template.format(**request))
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"[ERROR] No local file for {name} request: {source_path}")
+        shutil.copyfile(source_path, target)
+
+def create_client_factory(download_config: dict) -> Callable:
+    """
+    Returns a factory for the client configured in the download section. Each worker thread creates its own client.
+
+    Parameters:
+    download_config (dict): Dictionary containing download configuration parameters.
+
+    Usage:
+    client_factory = create_client_factory(config['download'])
+
+    Returns:
+    Callable: A function returning an object with a `retrieve(name, request, target)` method.
+    """
+    client = download_config.get('client', 'cds')
+    if client == 'cds':
+        import cdsapi
+        return cdsapi.Client
+    elif client == 'local':
+        return lambda: LocalCDSClient(download_config['local_source_dir'], download_config['filename_template'])
+    else:
+        raise ValueError(f"[ERROR] Unsupported download client: {client}. Choose either 'cds' or 'local'.")
+
+def build_request(download_config: dict, year: int) -> dict:
+    """
+    Builds the CDS request for one year of data.
+
+    Parameters:
+    download_config (dict): Dictionary containing download configuration parameters.
+    year (int): The year to request.
+
+    Usage:
+    request = build_request(config['download'], 2001)
+
+    Returns:
+    dict: The CDS request.
+    """
+    return {
+        'product_type': download_config.get('product_type', 'reanalysis'),
+        'format': 'netcdf',
+        'variable': download_config['variables'],
+        'year': year,
+        'month': MONTHS,
+        'day': DAYS,
+        'time': TIMES,
+        'area': download_config['area'],  # North, West, South, East
+    }
+
+def file_checksum(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 checksum of a file.
+
+    Parameters:
+    path (str): The file path.
+    block_size (int): Number of bytes read at a time. Default is 1 MiB.
+
+    Usage:
+    checksum = file_checksum('data/vietnam_cloud_data_2001.nc')
+
+    Returns:
+    str: The hexadecimal checksum.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Loads the download manifest, or returns an empty one if it does not exist.
+
+    Parameters:
+    manifest_path (str): The manifest file path.
+
+    Returns:
+    dict: A mapping of file name to its checksum, size and request.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as file:
+        return json.load(file)
+
+def save_manifest(manifest: dict, manifest_path: str) -> None:
+    """
+    Atomically writes the download manifest.
+
+    Parameters:
+    manifest (dict): The manifest to save.
+    manifest_path (str): The manifest file path.
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def is_downloaded(manifest: dict, path: str, request: dict) -> bool:
+    """
+    Checks whether a file was already downloaded for the same request and still matches its recorded checksum.
+
+    Parameters:
+    manifest (dict): The download manifest.
+    path (str): The target file path.
+    request (dict): The CDS request for the file.
+
+    Returns:
+    bool: True if the file can be skipped.
+    """
+    entry = manifest.get(os.path.basename(path))
+    if not entry or not os.path.exists(path) or entry['request'] != request:
+        return False
+    return os.path.getsize(path) == entry['size'] and file_checksum(path) == entry['sha256']
+
+def download_file(client, dataset: str, request: dict, path: str, max_retries: int = 5, backoff_seconds: float = 30) -> None:
+    """
+    Downloads one file with retries and exponential backoff. The data is written to a temporary file
+    and only moved to the target path once complete, so an interrupted download never leaves a partial file behind.
+
+    Parameters:
+    client: An object with a `retrieve(name, request, target)` method, e.g. `cdsapi.Client()`.
+    dataset (str): The CDS dataset name.
+    request (dict): The CDS request.
+    path (str): The target file path.
+    max_retries (int): Maximum number of attempts. Default is 5.
+    backoff_seconds (float): Base delay between attempts, doubled after every failure. Default is 30.
+    """
+    tmp_path = f"{path}.part"
+    for attempt in range(1, max_retries + 1):
+        try:
+            client.retrieve(dataset, request, tmp_path)
+            os.replace(tmp_path, path)
+            return
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if attempt == max_retries:
+                raise
+            delay = backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            print(f"[WARNING] Download of {path} failed (attempt {attempt}/{max_retries}): {e}. Retrying in {delay:.0f}s...")
+            time.sleep(delay)
+
+def download_cds_data(download_config: dict, client_factory: Callable = None) -> List[str]:
+    """
+    Downloads one NetCDF file per configured year, running up to `max_workers` requests concurrently.
+    Files already recorded in the manifest with a matching checksum are skipped, so an interrupted run resumes where it stopped.
+
+    Parameters:
+    download_config (dict): Dictionary containing download configuration parameters.
+    client_factory (Callable, optional): Function returning a client with a `retrieve(name, request, target)` method.
+                                         Default is the client configured in `download_config`.
+
+    Usage:
+    paths = download_cds_data(config['download'])
+    paths = download_cds_data(config['download'], client_factory=lambda: LocalCDSClient('fake_cds', 'data_{year}.nc'))
+
+    Returns:
+    List[str]: The paths of all files for the configured years.
+    """
+    save_dir = download_config['save_dir']
+    dataset = download_config.get('dataset', 'reanalysis-era5-single-levels')
+    first_year, last_year = download_config['years']
+    client_factory = client_factory or create_client_factory(download_config)
+
+    # Make saving directory if it doesn't exist
+    os.makedirs(save_dir, exist_ok=True)
+    manifest_path = os.path.join(save_dir, 'manifest.json')
+    manifest = load_manifest(manifest_path)
+    manifest_lock = threading.Lock()
+    local = threading.local()
+
+    jobs = []
+    for year in range(first_year, last_year + 1):
+        request = build_request(download_config, year)
+        path = os.path.join(save_dir, download_config['filename_template'].format(year=year))
+        if is_downloaded(manifest, path, request):
+            print(f"[INFO] Skipping {path}: already downloaded and verified.")
+        else:
+            jobs.append((path, request))
+
+    def run(path, request):
+        if not hasattr(local, 'client'):
+            local.client = client_factory()
+        download_file(local.client, dataset, request, path, download_config.get('max_retries', 5), download_config.get('backoff_seconds', 30))
+        entry = {'sha256': file_checksum(path), 'size': os.path.getsize(path), 'request': request}
+        with manifest_lock:
+            manifest[os.path.basename(path)] = entry
+            save_manifest(manifest, manifest_path)
+        print(f"[INFO] Downloaded {path}")
+
+    print(f"[INFO] Downloading {len(jobs)} files to {save_dir}...")
+    failures = []
+    with ThreadPoolExecutor(max_workers=download_config.get('max_workers', 4)) as executor:
+        futures = {executor.submit(run, path, request): path for path, request in jobs}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failures.append(futures[future])
+                print(f"[ERROR] Download of {futures[future]} failed: {e}")
+
+    if failures:
+        raise RuntimeError(f"[ERROR] {len(failures)} downloads failed: {sorted(failures)}. Run again to resume.")
+
+    return [os.path.join(save_dir, download_config['filename_template'].format(year=year)) for year in range(first_year, last_year + 1)]
+
+if __name__ == "__main__":
+    # The config is read here rather than with utils.file_utils.load_config, so the script also runs directly
+    # (`python datasets/cds/cds_data_downloader.py --config ...`) without the repository root on the path
+    import yaml
+
+    parser = argparse.ArgumentParser(description='Download ERA5 data from the Copernicus Climate Data Store')
+    parser.add_argument('--config', type=str, required=True, help='Path to configuration file with a download section (REQUIRED)')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as file:
+        download_cds_data(yaml.safe_load(file)['download'])
@@ -1,7 +1,12 @@
+import os
 import pandas as pd
-from pytorch_forecasting.data import GroupNormalizer, MultiNormalizer
-from pytorch_forecasting import TimeSeriesDataSet
-from utils.dataframe_utils import convert_to_datetime, factorize_column, drop_columns, check_and_handle_missing_values, consistency_check, convert_columns_to_string, add_cyclical_calendar_features
+import xarray as xr
+from typing import Iterator, List, Optional, Tuple, Union
+from utils.file_utils import get_file_paths
+from utils.dataset_utils import get_combined_dataset
+from utils.dataframe_utils import convert_to_dataframe
+from utils.store_utils import dataset_chunk_slices, read_dataset_chunk
+from utils.pipeline_utils import register_step, run_steps
 
 def filter_dataframe(
     df: pd.DataFrame,
@@ -22,28 +27,122 @@ def filter_dataframe(
     pd.DataFrame: The filtered DataFrame containing only the rows that meet all specified criteria.
     """
     # Convert 'time' column to datetime if it exists in the DataFrame
-    if 'time' in df.columns:
+    if 'time' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['time']):
         df['time'] = pd.to_datetime(df['time'])
     
+    # Combine all criteria into one mask so the rows are only selected once
+    mask = None
+
     # Apply latitude range filter
     if lat_range:
-        df = df[(df['latitude'] >= lat_range[0]) & (df['latitude'] <= lat_range[1])]
+        mask = df['latitude'].between(lat_range[0], lat_range[1])
     
     # Apply longitude range filter
     if long_range:
-        df = df[(df['longitude'] >= long_range[0]) & (df['longitude'] <= long_range[1])]
+        long_mask = df['longitude'].between(long_range[0], long_range[1])
+        mask = long_mask if mask is None else mask & long_mask
     
     # Apply time range filter
     if time_range:
-        start_time, end_time = pd.to_datetime(time_range[0]), pd.to_datetime(time_range[1])
-        df = df[(df['time'] >= start_time) & (df['time'] <= end_time)]
+        time_mask = df['time'].between(pd.to_datetime(time_range[0]), pd.to_datetime(time_range[1]))
+        mask = time_mask if mask is None else mask & time_mask
     
-    return df.reset_index(drop=True)
+    if mask is not None and not mask.all():
+        df = df[mask]
+    df.reset_index(drop=True, inplace=True)
+
+    return df
+
+register_step('filter_dataframe', filter_dataframe)
+
+def filter_dataset(
+    ds: xr.Dataset,
+    lat_range: list = None,
+    long_range: list = None,
+    time_range: list = None,
+) -> xr.Dataset:
+    """
+    Filter the xarray Dataset by latitude, longitude and time range using coordinate selections,
+    so that only the requested region and period is materialized when converting to a DataFrame.
+    Bounds are inclusive, matching `filter_dataframe`, and work for both ascending and descending coordinates.
+
+    Parameters:
+    ds (xr.Dataset): The input Dataset containing 'latitude', 'longitude' and 'time' coordinates.
+    lat_range (list[float, float], optional): Latitude range to include as (min_lat, max_lat). Default is None.
+    long_range (list[float, float], optional): Longitude range to include as (min_long, max_long). Default is None.
+    time_range (list[str, str], optional): The time range to include in format ('YYYY-MM-DD', 'YYYY-MM-DD'). Default is None.
+
+    Usage:
+    ds = filter_dataset(ds, lat_range=[10.5, 10.5], long_range=[106.5, 106.5], time_range=['2019-01-01', '2019-12-31'])
+
+    Returns:
+    xr.Dataset: The Dataset restricted to the requested coordinates.
+    """
+    selection = {}
+
+    if lat_range:
+        latitude = ds['latitude'].values
+        selection['latitude'] = (latitude >= lat_range[0]) & (latitude <= lat_range[1])
 
-def preprocess_cds_df(cds_df: pd.DataFrame, latitude_range: list, longtitude_range: list, time_range:list, calendar_cycle: dict, time_column: str = 'time') -> pd.DataFrame: 
+    if long_range:
+        longitude = ds['longitude'].values
+        selection['longitude'] = (longitude >= long_range[0]) & (longitude <= long_range[1])
+
+    if time_range:
+        start_time, end_time = pd.to_datetime(time_range[0]), pd.to_datetime(time_range[1])
+        time = pd.to_datetime(ds['time'].values)
+        selection['time'] = (time >= start_time) & (time <= end_time)
+
+    if selection:
+        ds = ds.isel(selection)
+        print(f"[INFO] Filtered dataset by {list(selection.keys())}. Remaining sizes: {dict(ds.sizes)}")
+
+    return ds
+
+def preprocess_cds_chunk(cds_df: pd.DataFrame, latitude_range: list, longtitude_range: list, time_range:list, calendar_cycle: dict, time_column: str = 'time', compact: bool = False, steps: list = None) -> pd.DataFrame:
+    """
+    Apply the row-local preprocessing steps of `preprocess_cds_df` to a DataFrame or to one chunk of groups:
+    converting to datetime, filtering, handling missing values, adding cyclical calendar features and converting the group columns.
+    The time column is kept so that the time index can be assigned consistently across chunks afterwards.
+    The steps run through the step engine; the ranges, calendar cycle, time column and dtypes are passed to every step that accepts them.
+
+    Parameters:
+    cds_df (pd.DataFrame): The input DataFrame or chunk to preprocess.
+    latitude_range (list): The latitude range to filter the data.
+    longtitude_range (list): The longitude range to filter the data.
+    time_range (list): The time range to filter the data.
+    calendar_cycle (dict): Dictionary containing the cyclical calendar features.
+    time_column (str): The name of the time column. Default is 'time'.
+    compact (bool): Whether to use compact dtypes. Default is False.
+    steps (list, optional): The configured preprocessing steps. Default is None, which runs the standard CDS steps.
+
+    Returns:
+    pd.DataFrame: The partially preprocessed DataFrame, still containing the time column.
+    """
+    context = {
+        'time_column': time_column,
+        'calendar_cycles': calendar_cycle,
+        'dtype': 'float32' if compact else 'float64',
+        'compact': compact,
+        'lat_range': latitude_range,
+        'long_range': longtitude_range,
+        'time_range': time_range,
+    }
+    steps = steps or [
+        {'convert_to_datetime': {'column': time_column}},
+        'filter_dataframe',
+        {'check_and_handle_missing_values': {'drop': True}},
+        'add_calendar_features',
+        {'convert_group_columns': {'columns': ['latitude', 'longitude']}},
+    ]
+
+    return run_steps(cds_df, steps, context, label='CDS preprocessing')
+
+def preprocess_cds_df(cds_df: pd.DataFrame, latitude_range: list, longtitude_range: list, time_range:list, calendar_cycle: dict, time_column: str = 'time', compact: bool = False, steps: list = None) -> pd.DataFrame: 
     """
     Preprocess the CDS DataFrame by converting to datetime, handling missing values,
     creating a combined time index, and dropping unnecessary columns.
+    In compact mode, latitude/longitude become categoricals, features and targets float32 and time_idx int32.
 
     Parameters:
     cds_df (pd.DataFrame): The input DataFrame to preprocess.
@@ -52,24 +151,26 @@ def preprocess_cds_df(cds_df: pd.DataFrame, latitude_range: list, longtitude_ran
     time_range (list): The time range to filter the data.
     calendar_cycle (dict): Dictionary containing the cyclical calendar features.
     time_column (str): The name of the time column. Default is 'time'.
+    compact (bool): Whether to use compact dtypes. Default is False.
+    steps (list, optional): The configured preprocessing steps. Default is None, which runs the standard CDS steps.
 
     Returns:
     pd.DataFrame: The preprocessed DataFrame.
     """
-    cds_df = convert_to_datetime(cds_df, column=time_column)
-    cds_df = filter_dataframe(cds_df, lat_range=latitude_range, long_range=longtitude_range, time_range=time_range)
-    cds_df = check_and_handle_missing_values(cds_df, drop=True)
-    cds_df = add_cyclical_calendar_features(cds_df, calendar_cycle, time_column)
-    cds_df = factorize_column(cds_df, column=time_column, new_column='time_idx')
-    cds_df = drop_columns(cds_df, [time_column])
-    cds_df = convert_columns_to_string(cds_df, ["latitude", "longitude"])
-    consistency_check(cds_df)
+    cds_df = preprocess_cds_chunk(cds_df, latitude_range, longtitude_range, time_range, calendar_cycle, time_column, compact=compact, steps=steps)
+    time_idx_steps = [
+        {'factorize_column': {'column': time_column, 'new_column': 'time_idx'}},
+        {'drop_columns': {'columns': [time_column]}},
+    ]
+    if compact:
+        time_idx_steps.append('compact_dtypes')
+    cds_df = run_steps(cds_df, time_idx_steps, label='CDS time index')
 
     print(f"[INFO] Preprocess completed:\n{cds_df}")
 
     return cds_df
 
-def create_cds_time_series_datasets(df: pd.DataFrame, time_series_config: dict,  mode: str = 'train'):
+def create_cds_time_series_datasets(df: pd.DataFrame, time_series_config: dict,  mode: str = 'train', dataset_parameters: dict = None):
     """
     Create TimeSeriesDataSet for both training and validation or evaluation.
 
@@ -77,6 +178,8 @@ def create_cds_time_series_datasets(df: pd.DataFrame, time_series_config: dict,
     df (pd.DataFrame): The input DataFrame.
     time_series_config (dict): Dictionary containing time series configuration parameters.
     mode (str): Mode of operation - 'train' or 'eval'.
+    dataset_parameters (dict, optional): Parameters of the fitted training dataset. In eval mode the evaluation dataset
+        reuses its normalizers, encoders and scalers instead of fitting new ones. Default is None.
 
     Returns:
     tuple: A tuple containing the training and validation TimeSeriesDataSets, or a single evaluation dataset.
@@ -85,6 +188,10 @@ def create_cds_time_series_datasets(df: pd.DataFrame, time_series_config: dict,
     train_dataset, val_dataset = create_cds_time_series_datasets(df, max_encoder_length=365, max_prediction_length=365, targets=['tcc', 'hcc'])
     eval_dataset = create_cds_time_series_datasets(df, max_encoder_length=365, max_prediction_length=365, targets=['tcc', 'hcc'], mode='eval')
     """
+    # Imported here so that preprocessing-only runs don't pay for loading pytorch_forecasting
+    from pytorch_forecasting.data import GroupNormalizer, MultiNormalizer
+    from pytorch_forecasting import TimeSeriesDataSet
+
     print(f'[INFO] Creating TimeSeriesDataSet for {mode} mode...')
 
     max_encoder_length = time_series_config['max_encoder_length']
@@ -143,10 +250,86 @@ def create_cds_time_series_datasets(df: pd.DataFrame, time_series_config: dict,
         return training_dataset, validation_dataset
 
     elif mode == 'eval':
-        eval_dataset = TimeSeriesDataSet(df, **common_params, predict_mode=True, stop_randomization=True)
+        if dataset_parameters is None:
+            print("[WARNING] No fitted dataset parameters given. Normalizers and encoders are fitted on the evaluation data and scale it differently from training.")
+            eval_dataset = TimeSeriesDataSet.from_parameters(common_params, df, predict=True, stop_randomization=True)
+        else:
+            # Nothing is fitted here, only the gap handling follows the evaluation data
+            eval_dataset = TimeSeriesDataSet.from_parameters(dataset_parameters, df, predict=True, stop_randomization=True, allow_missing_timesteps=allow_missing_timesteps)
         print(f'[INFO] Evaluation dataset created.')
 
         return None, eval_dataset
 
     else:
-        raise ValueError(f"Unsupported mode: {mode}. Choose either 'train' or 'eval'.")
\ No newline at end of file
+        raise ValueError(f"Unsupported mode: {mode}. Choose either 'train' or 'eval'.")
+
+# Dataset plugin interface, see datasets/__init__.py
+
+def load_options(data_config: dict, time_series_config: dict) -> dict:
+    """
+    Only the configured time range and the target variables are read from the NetCDF files.
+    """
+    return {'time_range': data_config.get('time_range'), 'variables': time_series_config['target_vars']}
+
+def filter_data(data: Union[xr.Dataset, pd.DataFrame], data_config: dict) -> Union[xr.Dataset, pd.DataFrame]:
+    """
+    Applies the configured latitude, longitude and time ranges to the Dataset before anything is converted.
+    """
+    if isinstance(data, xr.Dataset):
+        data = filter_dataset(data, data_config['latitude_range'], data_config['longtitude_range'], data_config['time_range'])
+    return data
+
+def to_dataframe(data: Union[xr.Dataset, pd.DataFrame], data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return convert_to_dataframe(data, variables=time_series_config['target_vars'])
+
+def preprocess_chunk(df: pd.DataFrame, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return preprocess_cds_chunk(df, data_config['latitude_range'], data_config['longtitude_range'], data_config['time_range'], data_config['calendar_cycle'], data_config['time_column'], compact=data_config.get('compact_dtypes', False), steps=data_config.get('preprocessing_steps'))
+
+def preprocess_df(df: pd.DataFrame, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return preprocess_cds_df(df, data_config['latitude_range'], data_config['longtitude_range'], data_config['time_range'], data_config['calendar_cycle'], data_config['time_column'], compact=data_config.get('compact_dtypes', False), steps=data_config.get('preprocessing_steps'))
+
+# Lazily opened datasets of `read_raw_chunk`, per process
+_chunk_sources = {}
+
+def open_chunk_source(data_root: str, data_config: dict, time_series_config: dict) -> xr.Dataset:
+    """
+    Opens the NetCDF files lazily with the configured filters and target variables.
+    """
+    index_dir = os.path.join((data_config.get('cache') or {}).get('cache_dir', './cache'), 'file_index')
+    ds = get_combined_dataset(data_root, lazy=True, chunks=data_config.get('chunks'), max_workers=data_config.get('io_workers', 4), index_dir=index_dir, **load_options(data_config, time_series_config))
+    return filter_data(ds, data_config)[time_series_config['target_vars']]
+
+def iter_raw_chunks(data_root: str, data_config: dict, time_series_config: dict, spill_dir: str) -> Tuple[Iterator[pd.DataFrame], Optional[List[dict]]]:
+    """
+    Splits the grid into chunks of whole grid cells and yields them one at a time, so only one chunk is materialized at a time.
+    The chunk slices are returned as tasks too, so worker processes can extract their chunks from the files in parallel.
+    """
+    chunked_config = data_config['chunked_preprocessing']
+
+    # Only the sizes are needed here; the files are closed again so that forked workers don't inherit open handles
+    with open_chunk_source(data_root, data_config, time_series_config) as ds:
+        chunk_slices = dataset_chunk_slices(ds, time_series_config['groups'], chunked_config.get('groups_per_chunk', 256))
+    chunks = (read_raw_chunk(chunk_slice, data_root, data_config, time_series_config) for chunk_slice in chunk_slices)
+    return chunks, chunk_slices
+
+def read_raw_chunk(task: dict, data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Reads the grid cells of one chunk slice, keeping the lazily opened files of the process for the following chunks.
+    The files are opened again when the selection or any input file changed since they were opened.
+    """
+    file_states = [(path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in sorted(get_file_paths(data_root))]
+    key = (data_root, repr(file_states), repr(load_options(data_config, time_series_config)), repr([data_config['latitude_range'], data_config['longtitude_range']]))
+    if key not in _chunk_sources:
+        close_chunk_sources()
+        _chunk_sources[key] = open_chunk_source(data_root, data_config, time_series_config)
+    return read_dataset_chunk(_chunk_sources[key], task)
+
+def close_chunk_sources() -> None:
+    """
+    Closes the files kept open by `read_raw_chunk` in this process.
+    """
+    while _chunk_sources:
+        _chunk_sources.popitem()[1].close()
+
+def create_datasets(df: pd.DataFrame, time_series_config: dict, mode: str = 'train', dataset_parameters: dict = None) -> tuple:
+    return create_cds_time_series_datasets(df, time_series_config=time_series_config, mode=mode, dataset_parameters=dataset_parameters)
@@ -1,38 +1,80 @@
 import pandas as pd
-from pytorch_forecasting.data import GroupNormalizer, MultiNormalizer
-from pytorch_forecasting import TimeSeriesDataSet
-from utils.dataframe_utils import convert_to_datetime, factorize_column, drop_columns, check_and_handle_missing_values, consistency_check, convert_columns_to_string, add_cyclical_calendar_features, add_weekend_feature, add_holidays_feature, add_end_of_year_holidays, convert_columns_to_float
+from typing import Iterator, List, Optional, Tuple
+from utils.file_utils import get_file_paths
+from utils.dataframe_utils import convert_to_dataframe
+from utils.store_utils import partition_files_by_groups
+from utils.pipeline_utils import run_steps
 
-def preprocess_tpssep22_df(df: pd.DataFrame, calendar_cycle: dict, target_columns: list, time_column: str = 'date') -> pd.DataFrame:
+def preprocess_tpssep22_chunk(df: pd.DataFrame, calendar_cycle: dict, target_columns: list, time_column: str = 'date', compact: bool = False, holidays_cache_dir: str = None, steps: list = None) -> pd.DataFrame:
+    """
+    Apply the row-local preprocessing steps of `preprocess_tpssep22_df` to a DataFrame or to one chunk of groups:
+    converting to datetime, handling missing values, adding calendar features and converting targets and group columns.
+    The time column is kept so that the time index can be assigned consistently across chunks afterwards.
+    The steps run through the step engine; the calendar cycle, time column, dtypes and holiday cache are passed to every step that accepts them.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame or chunk to preprocess.
+    calendar_cycle (dict): Dictionary containing the cyclical calendar features.
+    target_columns (list): List of target column names to convert to float.
+    time_column (str): The name of the time column. Default is 'date'.
+    compact (bool): Whether to use compact dtypes. Default is False.
+    holidays_cache_dir (str, optional): Directory of the on-disk holiday calendar cache. Default is None.
+    steps (list, optional): The configured preprocessing steps. Default is None, which runs the standard TPS SEP22 steps.
+
+    Returns:
+    pd.DataFrame: The partially preprocessed DataFrame, still containing the time column.
+    """
+    context = {
+        'time_column': time_column,
+        'calendar_cycles': calendar_cycle,
+        'dtype': 'float32' if compact else 'float64',
+        'cache_dir': holidays_cache_dir,
+    }
+    steps = steps or [
+        {'convert_to_datetime': {'column': time_column}},
+        {'check_and_handle_missing_values': {'drop': True}},
+        {'add_calendar_features': {'weekend': True, 'count_friday': True, 'end_of_year': True}},
+        {'add_holidays_feature': {'country_column': 'country'}},
+        {'convert_columns_to_float': {'columns': target_columns}},
+        {'drop_columns': {'columns': ['row_id']}},
+    ]
+    if compact:
+        steps = steps + [{'convert_columns_to_category': {'columns': ['country', 'store', 'product']}}]
+
+    return run_steps(df, steps, context, label='TPS SEP22 preprocessing')
+
+def preprocess_tpssep22_df(df: pd.DataFrame, calendar_cycle: dict, target_columns: list, time_column: str = 'date', compact: bool = False, holidays_cache_dir: str = None, steps: list = None) -> pd.DataFrame:
     """
     Preprocess the TPS SEP22 DataFrame by converting to datetime, handling missing values,
     creating a combined time index, adding cyclical calendar features, and dropping unnecessary columns.
+    In compact mode, country/store/product become categoricals, features and targets float32 and time_idx int32.
 
     Parameters:
     df (pd.DataFrame): The input DataFrame to preprocess.
     calendar_cycle (dict): Dictionary containing the cyclical calendar features.
     target_columns (list): List of target column names to convert to float.
     time_column (str): The name of the time column. Default is 'time'.
+    compact (bool): Whether to use compact dtypes. Default is False.
+    holidays_cache_dir (str, optional): Directory of the on-disk holiday calendar cache. Default is None.
+    steps (list, optional): The configured preprocessing steps. Default is None, which runs the standard TPS SEP22 steps.
 
     Returns:
     pd.DataFrame: The preprocessed DataFrame.
     """
-    df = convert_to_datetime(df, column=time_column)
-    df = check_and_handle_missing_values(df, drop=True)
-    df = add_cyclical_calendar_features(df, calendar_cycle, time_column)
-    df = add_weekend_feature(df, time_column, count_friday=True)
-    df = add_holidays_feature(df, time_column, 'country')
-    df = add_end_of_year_holidays(df, time_column)
-    df = convert_columns_to_float(df, target_columns)
-    df = factorize_column(df, column=time_column, new_column='time_idx')
-    df = drop_columns(df, [time_column, 'row_id'])
-    consistency_check(df)
+    df = preprocess_tpssep22_chunk(df, calendar_cycle, target_columns, time_column, compact=compact, holidays_cache_dir=holidays_cache_dir, steps=steps)
+    time_idx_steps = [
+        {'factorize_column': {'column': time_column, 'new_column': 'time_idx'}},
+        {'drop_columns': {'columns': [time_column]}},
+    ]
+    if compact:
+        time_idx_steps.append('compact_dtypes')
+    df = run_steps(df, time_idx_steps, label='TPS SEP22 time index')
 
     print(f"[INFO] Preprocess completed:\n{df}")
 
     return df
 
-def create_tpssep22_time_series_datasets(df: pd.DataFrame, time_series_config: dict,  mode: str = 'train'):
+def create_tpssep22_time_series_datasets(df: pd.DataFrame, time_series_config: dict,  mode: str = 'train', dataset_parameters: dict = None):
     """
     Create TimeSeriesDataSet for both training and validation or evaluation.
 
@@ -40,6 +82,8 @@ def create_tpssep22_time_series_datasets(df: pd.DataFrame, time_series_config: d
     df (pd.DataFrame): The input DataFrame.
     time_series_config (dict): Dictionary containing time series configuration parameters.
     mode (str): Mode of operation - 'train' or 'eval'.
+    dataset_parameters (dict, optional): Parameters of the fitted training dataset. In eval mode the evaluation dataset
+        reuses its normalizers, encoders and scalers instead of fitting new ones. Default is None.
 
     Returns:
     tuple: A tuple containing the training and validation TimeSeriesDataSets, or a single evaluation dataset.
@@ -48,6 +92,10 @@ def create_tpssep22_time_series_datasets(df: pd.DataFrame, time_series_config: d
     train_dataset, val_dataset = create_cds_time_series_datasets(df, max_encoder_length=365, max_prediction_length=365, targets=['tcc', 'hcc'])
     eval_dataset = create_cds_time_series_datasets(df, max_encoder_length=365, max_prediction_length=365, targets=['tcc', 'hcc'], mode='eval')
     """
+    # Imported here so that preprocessing-only runs don't pay for loading pytorch_forecasting
+    from pytorch_forecasting.data import GroupNormalizer, MultiNormalizer
+    from pytorch_forecasting import TimeSeriesDataSet
+
     print(f'[INFO] Creating TimeSeriesDataSet for {mode} mode...')
 
     max_encoder_length = time_series_config['max_encoder_length']
@@ -106,10 +154,51 @@ def create_tpssep22_time_series_datasets(df: pd.DataFrame, time_series_config: d
         return training_dataset, validation_dataset
 
     elif mode == 'eval':
-        eval_dataset = TimeSeriesDataSet(df, **common_params, predict_mode=True, stop_randomization=True)
+        if dataset_parameters is None:
+            print("[WARNING] No fitted dataset parameters given. Normalizers and encoders are fitted on the evaluation data and scale it differently from training.")
+            eval_dataset = TimeSeriesDataSet.from_parameters(common_params, df, predict=True, stop_randomization=True)
+        else:
+            # Nothing is fitted here, only the gap handling follows the evaluation data
+            eval_dataset = TimeSeriesDataSet.from_parameters(dataset_parameters, df, predict=True, stop_randomization=True, allow_missing_timesteps=allow_missing_timesteps)
         print(f'[INFO] Evaluation dataset created.')
 
         return None, eval_dataset
 
     else:
-        raise ValueError(f"Unsupported mode: {mode}. Choose either 'train' or 'eval'.")
\ No newline at end of file
+        raise ValueError(f"Unsupported mode: {mode}. Choose either 'train' or 'eval'.")
+
+# Dataset plugin interface, see datasets/__init__.py
+
+def load_options(data_config: dict, time_series_config: dict) -> dict:
+    return {}
+
+def filter_data(data: pd.DataFrame, data_config: dict) -> pd.DataFrame:
+    return data
+
+def to_dataframe(data: pd.DataFrame, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return convert_to_dataframe(data)
+
+def preprocess_chunk(df: pd.DataFrame, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return preprocess_tpssep22_chunk(df, data_config['calendar_cycle'], time_series_config['target_vars'], data_config['time_column'], compact=data_config.get('compact_dtypes', False), holidays_cache_dir=data_config.get('holidays_cache_dir'), steps=data_config.get('preprocessing_steps'))
+
+def preprocess_df(df: pd.DataFrame, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return preprocess_tpssep22_df(df, data_config['calendar_cycle'], time_series_config['target_vars'], data_config['time_column'], compact=data_config.get('compact_dtypes', False), holidays_cache_dir=data_config.get('holidays_cache_dir'), steps=data_config.get('preprocessing_steps'))
+
+def iter_raw_chunks(data_root: str, data_config: dict, time_series_config: dict, spill_dir: str) -> Tuple[Iterator[pd.DataFrame], Optional[List[str]]]:
+    """
+    Hash-partitions the tabular files by the group columns into Parquet files under `spill_dir` and yields one partition at a time.
+    The partition files are the chunk tasks.
+    """
+    partitions = partition_files_by_groups(get_file_paths(data_root), time_series_config['groups'], spill_dir, n_partitions=data_config['chunked_preprocessing'].get('partitions', 64))
+    return (read_raw_chunk(path, data_root, data_config, time_series_config) for path in partitions), partitions
+
+def read_raw_chunk(task: str, data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    return pd.read_parquet(task)
+
+def close_chunk_sources() -> None:
+    """
+    Partition files are read whole, so nothing is kept open between chunks.
+    """
+
+def create_datasets(df: pd.DataFrame, time_series_config: dict, mode: str = 'train', dataset_parameters: dict = None) -> tuple:
+    return create_tpssep22_time_series_datasets(df, time_series_config=time_series_config, mode=mode, dataset_parameters=dataset_parameters)
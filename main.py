@@ -1,11 +1,11 @@
 import argparse
 import os
 import sys
-import torch
-from tools.data_process import data_pipeline
-from tools.train import train_pipeline
-from tools.eval import evaluate_pipeline
-from utils.file_utils import create_training_directory, create_evaluation_directory, load_config, dump_config
+import time
+import psutil
+from utils.file_utils import create_training_directory, create_evaluation_directory, load_config, dump_config, find_dataset_parameters
+
+# Heavy dependencies (torch, Lightning, pytorch_forecasting, optuna) are imported inside the mode that needs them
 
 class Logger(object):
     def __init__(self, filename="log.txt"):
@@ -23,12 +23,22 @@ class Logger(object):
     def close(self):
         self.log.close()
 
+def report_startup(mode: str) -> None:
+    """
+    Print the time from process start until the pipeline of the mode is ready to run, which is dominated by imports.
+
+    Parameters:
+    mode (str): The run mode.
+    """
+    startup = time.time() - psutil.Process().create_time()
+    print(f"[INFO] Startup time for {mode} mode: {startup:.2f}s")
+
 def main(config: dict, model_path: str) -> None:
     """
     Main function to run the weather forecasting with Temporal Fusion Transformer.
     
-    Depending on the mode ('train' or 'eval'), it will create necessary directories, load data, train the model, 
-    or evaluate the model.
+    Depending on the mode ('train', 'eval' or 'data'), it will create necessary directories, load data, train the model, 
+    evaluate the model, or only preprocess the data (filling the cache and exporting to `data.save_dir` if set).
 
     Parameters:
     config (dict): Configuration dictionary loaded from a YAML file.
@@ -52,6 +62,10 @@ def main(config: dict, model_path: str) -> None:
         sys.stderr = sys.stdout
 
         try:
+            from tools.data_process import data_pipeline
+            from tools.train import train_pipeline
+            report_startup(args.mode)
+
             # Load the data
             train_dataloader, val_dataloader = data_pipeline(
                 data_root=data_config['data_root'],
@@ -59,7 +73,10 @@ def main(config: dict, model_path: str) -> None:
                 time_series_config=time_series_config,
                 batch_size=training_config['batch_size'],
                 num_workers=training_config['num_workers'],
-                mode='train'
+                mode='train',
+                window_sampling=training_config.get('window_sampling'),
+                batch_bucketing=training_config.get('batch_bucketing'),
+                distributed=(training_config.get('distributed') or {}).get('enable', False)
             )
 
             # Train the model
@@ -82,6 +99,18 @@ def main(config: dict, model_path: str) -> None:
         sys.stderr = sys.stdout
 
         try:
+            from tools.data_process import data_pipeline
+            from tools.eval import evaluate_pipeline
+            report_startup(args.mode)
+
+            # Use the model path from args if provided, else from config
+            model_path = model_path or evaluation_config['model_path']
+            print(f"[DEBUG] Model path: {model_path}")
+
+            # Fitted normalizers and encoders of the training run, from config if provided, else next to the model
+            dataset_parameters_path = evaluation_config.get('dataset_parameters_path') or find_dataset_parameters(model_path, config['checkpoint'].get('dataset_parameters_filename', 'dataset_parameters.pt'))
+            print(f"[DEBUG] Dataset parameters path: {dataset_parameters_path}")
+
             # Load the inference data
             _, eval_dataloader = data_pipeline(
                 data_root=evaluation_config['data_root'],
@@ -89,12 +118,9 @@ def main(config: dict, model_path: str) -> None:
                 time_series_config=time_series_config,
                 batch_size=training_config['batch_size'],
                 num_workers=training_config['num_workers'],
-                mode='eval'
+                mode='eval',
+                dataset_parameters_path=dataset_parameters_path
             )
-            
-            # Use the model path from args if provided, else from config
-            model_path = model_path or evaluation_config['model_path']
-            print(f"[DEBUG] Model path: {model_path}")
 
             # Evaluate the model
             evaluate_pipeline(model_path, eval_dataloader, inference_dir, config)
@@ -105,16 +131,27 @@ def main(config: dict, model_path: str) -> None:
             sys.stdout = sys.__stdout__
             sys.stderr = sys.__stderr__
 
+    elif args.mode == 'data':
+        from tools.data_process import preprocess_pipeline
+        report_startup(args.mode)
+
+        # Preprocess the data only
+        preprocess_pipeline(data_config['data_root'], data_config, time_series_config)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Weather Forecasting with Temporal Fusion Transformer')
-    parser.add_argument('--mode', type=str, choices=['train', 'eval'], required=True, help='Mode to run: train or eval')
+    parser.add_argument('--mode', type=str, choices=['train', 'eval', 'data'], required=True, help='Mode to run: train, eval or data (preprocessing only)')
     parser.add_argument('--config', type=str, required=True, help='Path to configuration file (REQUIRED)')
     parser.add_argument('--cuda_memory_fraction', type=float, default=0.5, help='Fraction of CUDA memory to use (e.g., 0.5 for 50%)')
     parser.add_argument('--model', type=str, default='', help='Path to model for evaluation')
+    parser.add_argument('--resume_tuning', action='store_true', help='Requeue tuning trials left running by an interrupted run. Only use it when no other worker of the study is running')
     args = parser.parse_args()
 
-    if args.cuda_memory_fraction:
+    if args.cuda_memory_fraction and args.mode != 'data':
+        import torch
         torch.cuda.set_per_process_memory_fraction(args.cuda_memory_fraction, 0)
 
     config = load_config(args.config)
+    if args.resume_tuning:
+        config['hyperparameter_tuning']['resume_interrupted'] = True
     main(config, args.model)
\ No newline at end of file
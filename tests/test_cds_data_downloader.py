@@ -0,0 +1,43 @@
+import json
+import pytest
+from datasets.cds.cds_data_downloader import LocalCDSClient, download_cds_data
+
+def make_download_config(tmp_path) -> dict:
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    for year in (2001, 2002):
+        (source_dir / f'data_{year}.nc').write_bytes(f'netcdf {year}'.encode())
+    return {
+        'client': 'local',
+        'local_source_dir': str(source_dir),
+        'variables': ['2m_temperature'],
+        'years': [2001, 2002],
+        'area': [23, 102, 8, 110],
+        'save_dir': str(tmp_path / 'data'),
+        'filename_template': 'data_{year}.nc',
+        'max_workers': 2,
+        'max_retries': 1,
+    }
+
+def test_download_from_local_directory(tmp_path):
+    download_config = make_download_config(tmp_path)
+    paths = download_cds_data(download_config)
+
+    assert [open(path, 'rb').read() for path in paths] == [b'netcdf 2001', b'netcdf 2002']
+    manifest = json.loads((tmp_path / 'data' / 'manifest.json').read_text())
+    assert sorted(manifest) == ['data_2001.nc', 'data_2002.nc']
+
+def test_download_resumes_from_manifest(tmp_path):
+    download_config = make_download_config(tmp_path)
+    download_cds_data(download_config)
+
+    # The verified 2001 file is skipped although its source is gone, while the corrupted 2002 file is fetched again
+    (tmp_path / 'data' / 'data_2002.nc').write_bytes(b'corrupted')
+    (tmp_path / 'source' / 'data_2001.nc').unlink()
+    download_cds_data(download_config)
+    assert (tmp_path / 'data' / 'data_2002.nc').read_bytes() == b'netcdf 2002'
+
+def test_local_client_reports_missing_files(tmp_path):
+    client = LocalCDSClient(str(tmp_path), 'data_{year}.nc')
+    with pytest.raises(FileNotFoundError):
+        client.retrieve('reanalysis-era5-single-levels', {'year': 2003}, str(tmp_path / 'out.nc'))
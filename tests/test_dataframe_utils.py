@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from utils.dataframe_utils import _HOLIDAY_CALENDARS, add_lag_features, get_holiday_dates, get_lag_feature_names
+
+def make_series(future_value: float, cutoff: int = 15, length: int = 40) -> pd.DataFrame:
+    # Two groups in shuffled row order, with the target switching to `future_value` from `cutoff` on
+    time_idx = np.tile(np.arange(length), 2)
+    df = pd.DataFrame({
+        'group': np.repeat(['a', 'b'], length),
+        'time_idx': time_idx,
+        'y': np.where(time_idx < cutoff, np.tile(np.arange(length), 2) % 3, future_value),
+    })
+    return df.sample(frac=1, random_state=0).reset_index(drop=True)
+
+def test_lag_features_ignore_future_targets():
+    cutoff, min_lag = 15, 10
+    features = get_lag_feature_names({'y': [10, 12]}, ['y'])
+    low = add_lag_features(make_series(0.0, cutoff), ['group'], {'y': [10, 12]}, ['y'], seasonal_period=12, min_lag=min_lag)
+    high = add_lag_features(make_series(100.0, cutoff), ['group'], {'y': [10, 12]}, ['y'], seasonal_period=12, min_lag=min_lag)
+
+    # A row's features may only read values at least `min_lag` steps earlier
+    known = low['time_idx'] < cutoff + min_lag
+    pd.testing.assert_frame_equal(low.loc[known, features], high.loc[known, features])
+    assert not np.allclose(low.loc[~known, features].to_numpy(), high.loc[~known, features].to_numpy())
+
+def test_lag_features_mask_rows_without_history():
+    df = add_lag_features(make_series(1.0), ['group'], {'y': [10]}, min_lag=10)
+
+    assert (df['y_history_available'] == (df['time_idx'] >= 10)).all()
+    assert (df.loc[df['time_idx'] < 10, 'y_lag_10'] == 0).all()
+
+def test_holiday_cache_rebuilds_unreadable_file(tmp_path):
+    (tmp_path / 'Belgium.json').write_text('{"2018": ["2018-01-01"')
+    _HOLIDAY_CALENDARS.pop('Belgium', None)
+
+    dates = get_holiday_dates('Belgium', [2018], cache_dir=str(tmp_path))
+
+    assert pd.Timestamp('2018-12-25') in dates
+    assert list(tmp_path.iterdir()) == [tmp_path / 'Belgium.json']
@@ -0,0 +1,85 @@
+import os
+import copy
+import time
+import pandas as pd
+import lightning.pytorch as pl
+from torch.utils.data import DataLoader
+from lightning.pytorch.callbacks import Callback
+from utils.execution_utils import compile_model
+
+class StepTimer(Callback):
+    """
+    Records the wall time of every training step.
+    """
+
+    def __init__(self):
+        self.step_times = []
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx) -> None:
+        self.start = time.perf_counter()
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx) -> None:
+        self.step_times.append(time.perf_counter() - self.start)
+
+def benchmark_execution_modes(train_dataloader: DataLoader, val_dataloader: DataLoader, logs_dir: str, config: dict, trainer_func: callable, model_func: callable) -> pd.DataFrame:
+    """
+    Trains a fresh model for a few steps in every configured execution mode (precision and torch.compile) from the same seed,
+    and reports the step time and validation loss of every mode side by side with fp32 eager execution.
+    The first steps are reported separately since they include compilation.
+
+    Parameters:
+    train_dataloader (DataLoader): DataLoader for the training data.
+    val_dataloader (DataLoader): DataLoader for the validation data.
+    logs_dir (str): The directory to save the report to.
+    config (dict): Dictionary containing configuration parameters.
+    trainer_func (callable): Function to create a PyTorch Lightning trainer.
+    model_func (callable): Function to initialize the Temporal Fusion Transformer model.
+
+    Usage:
+    report = benchmark_execution_modes(train_dataloader, val_dataloader, logs_dir, config, trainer_func=create_trainer, model_func=initialize_model)
+
+    Returns:
+    pd.DataFrame: One row per mode with the precision used, compilation, step times, validation loss and the comparison with fp32.
+    """
+    benchmark_config = config['training']['execution']['benchmark']
+    steps = benchmark_config.get('steps', 20)
+    warmup_steps = benchmark_config.get('warmup_steps', 3)
+    modes = benchmark_config.get('modes') or [{'precision': '32-true', 'compile': False}, {'precision': 'bf16-mixed', 'compile': False}]
+    # fp32 eager is the reference every mode is compared with
+    if {'precision': '32-true', 'compile': False} not in modes:
+        modes = [{'precision': '32-true', 'compile': False}] + modes
+
+    print(f"[INFO] Benchmarking execution modes for {steps} steps each: {modes}")
+    rows = []
+    for mode in modes:
+        mode_config = copy.deepcopy(config)
+        mode_config['training'].update(max_epochs=1, limit_train_batches=steps)
+        mode_config['training']['execution'].update(precision=mode.get('precision', '32-true'), compile=mode.get('compile', False))
+
+        pl.seed_everything(benchmark_config.get('seed', 42), verbose=False)
+        tft = model_func(train_dataloader, {}, mode_config['training'], target_count=len(config['time_series']['target_vars']))
+        timer = StepTimer()
+        trainer = trainer_func(mode_config, False, None, None, None, None, callbacks=[timer])
+
+        tft = compile_model(tft, mode.get('compile', False), mode_config['training']['execution'].get('compile_mode', 'default'))
+        trainer.fit(tft, train_dataloader, val_dataloader)
+
+        step_times = timer.step_times[warmup_steps:] or timer.step_times
+        rows.append({
+            'precision': trainer.precision,
+            'compile': mode.get('compile', False),
+            'warmup_s': sum(timer.step_times[:warmup_steps]),
+            'step_ms': 1000 * sum(step_times) / len(step_times),
+            'val_loss': trainer.callback_metrics['val_loss'].item(),
+        })
+
+    report = pd.DataFrame(rows)
+    reference = report.iloc[[i for i, mode in enumerate(modes) if mode == {'precision': '32-true', 'compile': False}][0]]
+    report['speedup'] = reference['step_ms'] / report['step_ms']
+    report['val_loss_change'] = report['val_loss'] / reference['val_loss'] - 1
+
+    report_path = os.path.join(logs_dir, 'execution_benchmark.csv')
+    report.to_csv(report_path, index=False)
+    print(f"[INFO] Execution mode benchmark (saved to {report_path}):\n{report.to_string(index=False, float_format=lambda value: f'{value:.4f}')}")
+
+    return report
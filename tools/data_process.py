@@ -1,19 +1,31 @@
+import os
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
-from pytorch_forecasting import TimeSeriesDataSet
-from utils.dataset_utils import get_combined_dataset
-from utils.dataframe_utils import convert_to_dataframe, save_to_csv
-from datasets.cds.data_handling import preprocess_cds_df, create_cds_time_series_datasets
-from datasets.tps_sep22.data_handling import preprocess_tpssep22_df, create_tpssep22_time_series_datasets
+from datasets import get_dataset_plugin
+from utils.dataset_utils import get_combined_dataset, build_file_index, select_files
+from utils.file_utils import get_file_paths, load_dataset_parameters
+from utils.cache_utils import compute_cache_key, get_cache_path, load_cached_dataframe, save_cached_dataframe, load_cached_datasets, save_cached_datasets
+from utils.dataframe_utils import save_to_csv, save_to_parquet, compact_dtypes, consistency_check, resolve_allow_missing_timesteps, add_lag_features, get_lag_feature_names
+from utils.store_utils import clear_store, list_store_parts, write_store_part, assign_store_time_idx, load_store, last_store_time_idx
 
-def dataloader(dataset: TimeSeriesDataSet, train: bool, batch_size: int, num_workers: int) -> pd.DataFrame:
+def dataloader(dataset: 'TimeSeriesDataSet', train: bool, batch_size: int, num_workers: int, window_sampling: dict = None, batch_bucketing: dict = None, distributed: bool = False) -> pd.DataFrame:
     """
     Create a DataLoader from a TimeSeriesDataSet.
+    With `window_sampling` enabled, training epochs draw a strided, capped and budgeted subset of the windows (see `WindowSampler`).
+    With `batch_bucketing` enabled, training batches group windows of similar length, optionally weighted (see `BucketBatchSampler`).
+    In distributed training, the training samplers hand every process its own shard. Validation is not sharded,
+    so every process computes the same validation metrics.
 
     Parameters:
     dataset (TimeSeriesDataSet): The TimeSeriesDataSet to convert into a DataLoader.
     train (bool): Whether the DataLoader is for training or validation.
     batch_size (int): The batch size for the DataLoader.
     num_workers (int): The number of workers for the DataLoader.
+    window_sampling (dict, optional): The `training.window_sampling` configuration. Only used for training. Default is None.
+    batch_bucketing (dict, optional): The `training.batch_bucketing` configuration. Only used for training. Default is None.
+    distributed (bool): Whether the DataLoader is used for distributed training. Default is False.
 
     Returns:
     DataLoader: A PyTorch DataLoader for the given TimeSeriesDataSet.
@@ -23,9 +35,501 @@ def dataloader(dataset: TimeSeriesDataSet, train: bool, batch_size: int, num_wor
     val_loader = dataloader(validation_dataset, train=False, batch_size=16, num_workers=4)
     """
     print(f"[INFO] Creating DataLoader for {'training' if train else 'validation'}...")
-    return dataset.to_dataloader(train=train, batch_size=batch_size, num_workers=num_workers, persistent_workers=True)
+    window_sampling = window_sampling or {}
+    batch_bucketing = batch_bucketing or {}
+    if not train or not (window_sampling.get('enable', False) or batch_bucketing.get('enable', False) or distributed):
+        return dataset.to_dataloader(train=train, batch_size=batch_size, num_workers=num_workers, persistent_workers=True)
 
-def data_pipeline(data_root: str, data_config: dict, time_series_config: dict, batch_size: int = 16, num_workers: int = 4, mode: str = 'train', dataloading: bool = True) -> tuple:
+    from utils.sampler_utils import WindowSampler, BucketBatchSampler
+
+    sampler = None
+    if window_sampling.get('enable', False) or (distributed and not batch_bucketing.get('enable', False)):
+        # Without window sampling this shuffles all windows, sharded over the processes
+        window_sampling = window_sampling if window_sampling.get('enable', False) else {'seed': window_sampling.get('seed', 0)}
+        sampler = WindowSampler(
+            dataset,
+            stride=window_sampling.get('stride', 1),
+            max_samples_per_group=window_sampling.get('max_samples_per_group'),
+            samples_per_epoch=window_sampling.get('samples_per_epoch'),
+            seed=window_sampling.get('seed', 0),
+            shard=not batch_bucketing.get('enable', False),
+        )
+    if not batch_bucketing.get('enable', False):
+        return dataset.to_dataloader(train=train, batch_size=batch_size, num_workers=num_workers, persistent_workers=True, sampler=sampler, shuffle=False)
+
+    batch_sampler = BucketBatchSampler(
+        dataset,
+        batch_size=batch_size,
+        sampler=sampler,
+        bucket_width=batch_bucketing.get('bucket_width', 1),
+        weighting=batch_bucketing.get('weighting'),
+        recency_half_life=batch_bucketing.get('recency_half_life'),
+        drop_last=batch_bucketing.get('drop_last', False),
+        seed=batch_bucketing.get('seed', 0),
+    )
+    return dataset.to_dataloader(train=train, batch_size=batch_size, num_workers=num_workers, persistent_workers=True, batch_sampler=batch_sampler)
+
+def load_data(data_root: str, data_config: dict, time_series_config: dict):
+    """
+    Load the raw data files for the configured data source. The data source plugin adds its own loading options
+    (e.g. the CDS time range and variables) and filters the loaded data before anything is converted.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc') or a single file path.
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    Union[xr.Dataset, pd.DataFrame]: The loaded data.
+
+    Usage:
+    ds = load_data('data/samples/*.nc', data_config, time_series_config)
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+    lazy_loading = data_config.get('lazy_loading', False)
+    chunks = data_config.get('chunks')
+    columns = data_config.get('columns') or None
+    filters = [tuple(condition) for condition in data_config['filters']] if data_config.get('filters') else None
+    io_workers = data_config.get('io_workers', 4)
+    index_dir = os.path.join((data_config.get('cache') or {}).get('cache_dir', './cache'), 'file_index')
+
+    # Load the data
+    ds = get_combined_dataset(data_root, lazy=lazy_loading, chunks=chunks, columns=columns, filters=filters, max_workers=io_workers, index_dir=index_dir, **plugin.load_options(data_config, time_series_config))
+    print("[INFO] Data loaded successfully.")
+
+    return plugin.filter_data(ds, data_config)
+
+def preprocess_data(data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Load the raw data files and preprocess them into a DataFrame for the configured data source.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc').
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    pd.DataFrame: The preprocessed DataFrame.
+
+    Usage:
+    df = preprocess_data('data/samples/*.nc', data_config, time_series_config)
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+
+    ds = load_data(data_root, data_config, time_series_config)
+
+    # Preprocess the data
+    df = plugin.to_dataframe(ds, data_config, time_series_config)
+    return plugin.preprocess_df(df, data_config, time_series_config)
+
+def select_data_paths(data_paths: list, data_config: dict, time_series_config: dict) -> list:
+    """
+    Selects the input files that hold data for the configured data source, using the persistent file index
+    and the plugin's loading options (e.g. the CDS time range and variables). Files outside the selection are never opened.
+
+    Parameters:
+    data_paths (list): The input file paths.
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    list: The selected file paths, in their original order.
+
+    Usage:
+    paths = select_data_paths(['data/2023.nc', 'data/2024.nc'], data_config, time_series_config)
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+    index_dir = os.path.join((data_config.get('cache') or {}).get('cache_dir', './cache'), 'file_index')
+
+    index = build_file_index(data_paths, max_workers=data_config.get('io_workers', 4), index_dir=index_dir)
+    return select_files(data_paths, index, **plugin.load_options(data_config, time_series_config))
+
+def preprocess_rows(data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Load the raw data files and apply only the row-local preprocessing steps of the configured data source.
+    The time column is kept and no time index is assigned, so the result can be appended to an existing store.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc') or a single file path.
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    pd.DataFrame: The partially preprocessed DataFrame, still containing the time column.
+
+    Usage:
+    df = preprocess_rows('data/2024.nc', data_config, time_series_config)
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+
+    ds = load_data(data_root, data_config, time_series_config)
+    df = plugin.to_dataframe(ds, data_config, time_series_config)
+
+    return preprocess_chunk(df, data_config, time_series_config)
+
+def preprocess_data_incremental(data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Preprocess only the input files that are not yet in the incremental store and append them.
+    The store keeps a manifest of processed files and the sorted timestamps behind the existing time index;
+    timestamps of new files extend that index, so previously written rows keep their time_idx.
+    The store is rebuilt from scratch when the configuration changes, a processed file was modified or removed,
+    or a new file holds timestamps that fall inside the already indexed history or rows that repeat stored time indices of their group.
+    Appended rows are checked to continue every group's time index without gaps or duplicates.
+    New files are first matched against the file index, so files outside the time range are recorded and skipped without being opened,
+    and the others are preprocessed and written one file at a time.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc').
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    pd.DataFrame: The preprocessed DataFrame covering all input files.
+
+    Usage:
+    df = preprocess_data_incremental('data/samples/*.nc', data_config, time_series_config)
+    """
+    time_column = data_config['time_column']
+    compact = data_config.get('compact_dtypes', False)
+    time_idx_dtype = 'int32' if compact else 'int64'
+
+    # One store per input pattern, so training and evaluation data do not overwrite each other
+    store_dir = os.path.join(data_config['incremental']['store_dir'], compute_cache_key([], {'data_root': os.path.abspath(data_root)})[:16])
+    manifest_path = os.path.join(store_dir, 'manifest.json')
+    time_values_path = os.path.join(store_dir, 'time_values.parquet')
+
+    excluded_keys = ('cache', 'save_dir', 'incremental', 'chunked_preprocessing', 'io_workers')
+    config_key = compute_cache_key([], {key: value for key, value in data_config.items() if key not in excluded_keys}, time_series_config)
+    data_paths = sorted(get_file_paths(data_root))
+    file_states = {os.path.abspath(path): [os.stat(path).st_mtime_ns, os.stat(path).st_size] for path in data_paths}
+
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+    if manifest is None or manifest['config_key'] != config_key or any(file_states.get(path) != state for path, state in manifest['files'].items()):
+        print(f"[INFO] Building incremental store {store_dir} from scratch.")
+        clear_store(store_dir)
+        manifest = {'config_key': config_key, 'files': {}, 'parts': 0}
+        time_values = None
+    else:
+        time_values = pd.Index(pd.read_parquet(time_values_path)[time_column])
+
+    new_paths = [path for path in data_paths if os.path.abspath(path) not in manifest['files']]
+    print(f"[INFO] Incremental store has {len(manifest['files'])} processed files, {len(new_paths)} new.")
+
+    if new_paths:
+        # Files the time range or variable selection drops are recorded as processed, so they are not checked again
+        selected_paths = select_data_paths(new_paths, data_config, time_series_config)
+        for path in sorted(set(new_paths) - set(selected_paths)):
+            manifest['files'][os.path.abspath(path)] = file_states[os.path.abspath(path)]
+
+        # Parts of an interrupted run that never made it into the manifest
+        for path in list_store_parts(store_dir)[manifest['parts']:]:
+            os.remove(path)
+
+        groups = time_series_config['groups']
+        last = last_store_time_idx(store_dir, groups) if manifest['parts'] else None
+
+        # First pass: preprocess and write one file at a time, keeping only its timestamps
+        new_part_paths = []
+        new_times = pd.Index([])
+        for path in selected_paths:
+            part = preprocess_rows(path, data_config, time_series_config)
+            if len(part):
+                new_times = new_times.union(pd.Index(part[time_column].unique()))
+                new_part_paths.append(write_store_part(part, store_dir, manifest['parts'] + len(new_part_paths)))
+            del part
+
+        if time_values is not None:
+            new_times = new_times.difference(time_values)
+            if len(new_times) and new_times.min() < time_values.max():
+                print("[WARNING] New files contain timestamps inside the indexed history. Rebuilding the incremental store.")
+                shutil.rmtree(store_dir)
+                return preprocess_data_incremental(data_root, data_config, time_series_config)
+            time_values = time_values.append(new_times)
+        else:
+            time_values = new_times.sort_values()
+
+        # Second pass: replace the time column of every new part with the extended time index
+        new_rows = []
+        for part_path in new_part_paths:
+            part = pd.read_parquet(part_path)
+            part['time_idx'] = time_values.get_indexer(part[time_column]).astype(time_idx_dtype)
+            part = part.drop(columns=[time_column])
+            part.to_parquet(part_path, index=False)
+            if last is not None:
+                new_rows.append(part[groups + ['time_idx']])
+            del part
+
+        if new_rows:
+            # The appended rows must continue every group after its last stored time index
+            new_rows = pd.concat(new_rows, ignore_index=True)
+            merged = new_rows.merge(last.rename(columns={'time_idx': 'last_time_idx'}), on=groups, how='left')
+            overlapping = int((merged['time_idx'] <= merged['last_time_idx']).sum())
+            if overlapping:
+                print(f"[WARNING] {overlapping} new rows repeat or precede stored time indices of their group. Rebuilding the incremental store.")
+                shutil.rmtree(store_dir)
+                return preprocess_data_incremental(data_root, data_config, time_series_config)
+            report = consistency_check(pd.concat([last, new_rows], ignore_index=True), groups=groups)
+            if report['missing_timesteps'] or report['duplicates']:
+                print("[WARNING] The appended rows don't continue the stored time index of every group without gaps or duplicates.")
+
+        manifest['parts'] += len(new_part_paths)
+        for path in selected_paths:
+            manifest['files'][os.path.abspath(path)] = file_states[os.path.abspath(path)]
+
+        if not manifest['parts']:
+            raise ValueError(f"[ERROR] None of the files matching {data_root} holds data within the configured time range and variables.")
+        pd.DataFrame({time_column: time_values}).to_parquet(time_values_path, index=False)
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=2)
+
+    df = load_store(store_dir)
+    print(f"[INFO] Incremental preprocess completed:\n{df}")
+
+    return df
+
+def preprocess_chunk(chunk_df: pd.DataFrame, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Apply the row-local preprocessing steps of the configured data source to one chunk of whole groups.
+
+    Parameters:
+    chunk_df (pd.DataFrame): The raw rows of the chunk.
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    pd.DataFrame: The preprocessed chunk, still containing the time column.
+
+    Usage:
+    chunk_df = preprocess_chunk(chunk_df, data_config, time_series_config)
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+
+    chunk_df = plugin.preprocess_chunk(chunk_df, data_config, time_series_config)
+    if data_config.get('compact_dtypes', False):
+        chunk_df = compact_dtypes(chunk_df)
+    return chunk_df
+
+def preprocess_chunk_file(input_path: str, store_dir: str, part_id: int, data_config: dict, time_series_config: dict, remove_input: bool = True) -> int:
+    """
+    Worker of the parallel chunked preprocessing: reads one chunk from a Parquet file, preprocesses it
+    and writes it to the store as part `part_id`. Chunks are handed over through files, so only paths are sent between processes.
+
+    Parameters:
+    input_path (str): The Parquet file holding the raw rows of the chunk.
+    store_dir (str): The store directory.
+    part_id (int): The sequence number of the part, which fixes its position when the store is loaded.
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+    remove_input (bool): Whether to delete the input file afterwards. Default is True.
+
+    Returns:
+    int: The number of preprocessed rows written.
+    """
+    chunk_df = preprocess_chunk(pd.read_parquet(input_path), data_config, time_series_config)
+    if len(chunk_df):
+        write_store_part(chunk_df, store_dir, part_id)
+    if remove_input:
+        os.remove(input_path)
+    return len(chunk_df)
+
+def preprocess_raw_chunk(task, data_root: str, store_dir: str, part_id: int, data_config: dict, time_series_config: dict) -> int:
+    """
+    Worker of the parallel chunked preprocessing for plugins with chunk tasks: reads the raw rows of one chunk
+    through the plugin, preprocesses them and writes them to the store as part `part_id`. Only the small task description
+    is sent to the process, so reading the raw data runs in parallel as well.
+
+    Parameters:
+    task: The plugin's description of the chunk, e.g. a grid slice or a partition file.
+    data_root (str): The directory pattern of the input files.
+    store_dir (str): The store directory.
+    part_id (int): The sequence number of the part, which fixes its position when the store is loaded.
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    int: The number of preprocessed rows written.
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+
+    chunk_df = preprocess_chunk(plugin.read_raw_chunk(task, data_root, data_config, time_series_config), data_config, time_series_config)
+    if len(chunk_df):
+        write_store_part(chunk_df, store_dir, part_id)
+    return len(chunk_df)
+
+def preprocess_data_chunked(data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Preprocess the raw data out of core, one chunk of whole groups at a time, appending each chunk to an on-disk store.
+    NetCDF inputs are opened lazily and split along the grid; tabular inputs are first hash-partitioned by the group columns.
+    The time index is assigned globally across all chunks once every chunk has been written.
+    With `chunked_preprocessing.workers` above 1, chunks are preprocessed in a process pool. Workers read their chunks themselves from the
+    plugin's chunk tasks (grid slices, partition files); for plugins without tasks, the chunks are handed over as Parquet files.
+    Every chunk is written as the part numbered by its chunk position, so the merged result does not depend on which worker finishes first.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc').
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    pd.DataFrame: The preprocessed DataFrame loaded from the store.
+
+    Usage:
+    df = preprocess_data_chunked('data/samples/*.nc', data_config, time_series_config)
+    """
+    plugin = get_dataset_plugin(data_config['data_source'])
+    time_column = data_config['time_column']
+    compact = data_config.get('compact_dtypes', False)
+    chunked_config = data_config['chunked_preprocessing']
+    store_dir = chunked_config['store_dir']
+    workers = chunked_config.get('workers', 1)
+    spill_dir = os.path.join(store_dir, 'spill')
+
+    clear_store(store_dir)
+
+    try:
+        # Chunk tasks are set when workers can read the chunks themselves, e.g. grid slices or tabular group partitions
+        chunks, chunk_tasks = plugin.iter_raw_chunks(data_root, data_config, time_series_config, spill_dir)
+
+        if workers > 1:
+            os.makedirs(spill_dir, exist_ok=True)
+            print(f"[INFO] Preprocessing chunks with {workers} worker processes...")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = []
+                if chunk_tasks is not None:
+                    futures = [executor.submit(preprocess_raw_chunk, task, data_root, store_dir, part_id, data_config, time_series_config) for part_id, task in enumerate(chunk_tasks)]
+                else:
+                    for part_id, chunk_df in enumerate(chunks):
+                        # Bound the number of chunks waiting on disk
+                        pending = {future for future in futures if not future.done()}
+                        while len(pending) >= 2 * workers:
+                            pending = wait(pending, return_when=FIRST_COMPLETED).not_done
+                        input_path = os.path.join(spill_dir, f'chunk-{part_id:05d}.parquet')
+                        chunk_df.to_parquet(input_path, index=False)
+                        futures.append(executor.submit(preprocess_chunk_file, input_path, store_dir, part_id, data_config, time_series_config))
+                rows = sum(future.result() for future in futures)
+            print(f"[INFO] Preprocessed {rows} rows in {len(futures)} chunks.")
+        else:
+            part_id = 0
+            for chunk_df in chunks:
+                chunk_df = preprocess_chunk(chunk_df, data_config, time_series_config)
+                if len(chunk_df):
+                    write_store_part(chunk_df, store_dir, part_id)
+                    part_id += 1
+    finally:
+        # Files the serial path read chunks from stay open until here
+        plugin.close_chunk_sources()
+
+    if os.path.exists(spill_dir):
+        shutil.rmtree(spill_dir)
+
+    # Global step: a single time index over all chunks. The per-group gap check runs in `create_time_series_datasets`
+    assign_store_time_idx(store_dir, time_column, new_column='time_idx', dtype='int32' if compact else 'int64')
+
+    df = load_store(store_dir)
+    print(f"[INFO] Chunked preprocess completed:\n{df}")
+
+    return df
+
+def create_time_series_datasets(df: pd.DataFrame, data_source: str, time_series_config: dict, mode: str = 'train', dataset_parameters: dict = None) -> tuple:
+    """
+    Create the TimeSeriesDataSets for the configured data source.
+    The DataFrame is checked for per-group gaps and duplicates first, and `allow_missing_timesteps` is resolved from that report.
+    Configured `lag_features` are then computed once per group and added to the known reals.
+
+    Parameters:
+    df (pd.DataFrame): The preprocessed DataFrame.
+    data_source (str): The data source name (e.g., 'cds', 'tps_sep22').
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+    mode (str): Mode of operation - 'train' or 'eval'.
+    dataset_parameters (dict, optional): Fitted parameters of the training dataset to build the evaluation dataset from. Default is None.
+
+    Returns:
+    tuple: A tuple containing (training TimeSeriesDataSet, validation TimeSeriesDataSet) or (None, evaluation TimeSeriesDataSet).
+
+    Usage:
+    training_dataset, validation_dataset = create_time_series_datasets(df, 'cds', time_series_config, mode='train')
+    """
+    # Check every group for gaps and duplicates before TimeSeriesDataSet indexes the data
+    report = consistency_check(df, groups=time_series_config['groups'])
+    allow_missing_timesteps = resolve_allow_missing_timesteps(report, time_series_config['allow_missing_timesteps'])
+    time_series_config = {**time_series_config, 'allow_missing_timesteps': allow_missing_timesteps}
+
+    # Long lags and climatologies as precomputed columns, so they don't lengthen every window like `lags` do
+    lag_config = time_series_config.get('lag_features') or {}
+    if lag_config.get('lags') or lag_config.get('climatology'):
+        df = add_lag_features(df, time_series_config['groups'], lag_config.get('lags'), lag_config.get('climatology'), lag_config.get('seasonal_period', 0), min_lag=time_series_config['max_prediction_length'])
+        known_reals = time_series_config['time_varying_known_reals']
+        lag_features = [name for name in get_lag_feature_names(lag_config.get('lags'), lag_config.get('climatology')) if name not in known_reals]
+        time_series_config = {**time_series_config, 'time_varying_known_reals': known_reals + lag_features}
+
+    return get_dataset_plugin(data_source).create_datasets(df, time_series_config=time_series_config, mode=mode, dataset_parameters=dataset_parameters)
+
+def get_cache_key(data_root: str, data_config: dict, time_series_config: dict) -> str:
+    """
+    Computes the cache key of the preprocessed data from the input files and every setting that affects preprocessing,
+    but not the cache/output locations.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc').
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    str: The cache key.
+    """
+    key_config = {key: value for key, value in data_config.items() if key not in ('cache', 'save_dir')}
+    return compute_cache_key(get_file_paths(data_root), key_config, time_series_config)
+
+def preprocess_pipeline(data_root: str, data_config: dict, time_series_config: dict) -> pd.DataFrame:
+    """
+    Load and preprocess the data with the configured strategy (incremental, chunked or in memory), reusing the cached
+    DataFrame when the inputs and settings are unchanged, and export it if `save_dir` is set.
+    This needs neither torch nor pytorch_forecasting, so preprocessing-only runs start quickly.
+
+    Parameters:
+    data_root (str): The directory pattern to search for files (e.g., 'data/*.nc').
+    data_config (dict): Dictionary containing data configuration parameters.
+    time_series_config (dict): Dictionary containing time series configuration parameters.
+
+    Returns:
+    pd.DataFrame: The preprocessed DataFrame.
+
+    Usage:
+    df = preprocess_pipeline('data/samples/*.nc', data_config, time_series_config)
+    """
+    save_dir = data_config['save_dir']
+    cache_config = data_config.get('cache') or {}
+    use_cache = cache_config.get('enable', False)
+
+    df = None
+    if use_cache:
+        cache_key = get_cache_key(data_root, data_config, time_series_config)
+        df = load_cached_dataframe(cache_config['cache_dir'], cache_key)
+
+    if df is None:
+        if (data_config.get('incremental') or {}).get('enable', False):
+            df = preprocess_data_incremental(data_root, data_config, time_series_config)
+        elif (data_config.get('chunked_preprocessing') or {}).get('enable', False):
+            df = preprocess_data_chunked(data_root, data_config, time_series_config)
+        else:
+            df = preprocess_data(data_root, data_config, time_series_config)
+
+        if use_cache:
+            save_cached_dataframe(df, cache_config['cache_dir'], cache_key, max_size_gb=cache_config.get('max_size_gb'))
+
+    if save_dir:
+        if save_dir.endswith('.csv'):
+            save_to_csv(df, save_dir)
+        else:
+            save_to_parquet(df, save_dir, groups=time_series_config['groups'])
+
+    return df
+
+def data_pipeline(data_root: str, data_config: dict, time_series_config: dict, batch_size: int = 16, num_workers: int = 4, mode: str = 'train', dataloading: bool = True, dataset_parameters_path: str = None, window_sampling: dict = None, batch_bucketing: dict = None, distributed: bool = False) -> tuple:
     """
     Execute the data pipeline by loading, preprocessing (save preprocessed data if requested), creating datasets, and DataLoaders.
 
@@ -36,6 +540,11 @@ def data_pipeline(data_root: str, data_config: dict, time_series_config: dict, b
     batch_size (int): The batch size for DataLoader. Default is `16`.
     num_workers (int): The number of workers for DataLoader. Default is `4`.
     dataloading (bool): Whether to create DataLoaders. Default is `True`. Else return TimeSeriesDataSets.
+    dataset_parameters_path (str, optional): Fitted dataset parameters of the training run (see `find_dataset_parameters`).
+        In eval mode the evaluation dataset is built from them without fitting. Default is None.
+    window_sampling (dict, optional): Per-epoch sampling of the training windows (see `dataloader`). Default is None.
+    batch_bucketing (dict, optional): Length-bucketed and weighted training batches (see `dataloader`). Default is None.
+    distributed (bool): Whether the DataLoaders are used for distributed training. Default is False.
 
     Returns:
     tuple: A tuple containing (training DataLoader, validation DataLoader) or (None, evaluation Dataloader).
@@ -53,47 +562,54 @@ def data_pipeline(data_root: str, data_config: dict, time_series_config: dict, b
         save_dir='preprocessed_data.csv'
     )
     """
-    target_vars = time_series_config['target_vars']
     data_source = data_config['data_source']
-    time_column = data_config['time_column']
-    calendar_cycle = data_config['calendar_cycle']
     save_dir = data_config['save_dir']
+    cache_config = data_config.get('cache') or {}
+    use_cache = cache_config.get('enable', False)
+    cache_datasets = use_cache and cache_config.get('datasets', False)
 
-    # Load the data
-    ds = get_combined_dataset(data_root)
-    print("[INFO] Data loaded successfully.")
+    if use_cache:
+        cache_key = get_cache_key(data_root, data_config, time_series_config)
+        # Datasets built from fitted parameters also depend on the training run they came from
+        dataset_cache_key = compute_cache_key([dataset_parameters_path], {'data': cache_key}) if dataset_parameters_path else cache_key
 
-    training_dataset, validation_dataset = None, None
-    
-    # Preprocess the data
-    if data_source == 'cds':
-        latitude_range = data_config['latitude_range']
-        longtitude_range = data_config['longtitude_range']
-        time_range = data_config['time_range']
-        df = convert_to_dataframe(ds, variables=target_vars)
-        df = preprocess_cds_df(df, latitude_range, longtitude_range, time_range, calendar_cycle, time_column)
-
-        if save_dir:
-            save_to_csv(df, save_dir)
+    datasets = None
+    if cache_datasets:
+        datasets = load_cached_datasets(cache_config['cache_dir'], dataset_cache_key, mode)
 
-        training_dataset, validation_dataset = create_cds_time_series_datasets(df, time_series_config=time_series_config, mode=mode)
-    elif data_source == 'tps_sep22':
-        df = convert_to_dataframe(ds)
-        df = preprocess_tpssep22_df(df, calendar_cycle, target_vars, time_column)
+    # The DataFrame is only needed when the datasets have to be built or the preprocessed data is exported
+    if datasets is None or save_dir:
+        df = preprocess_pipeline(data_root, data_config, time_series_config)
 
-        if save_dir:
-            save_to_csv(df, save_dir)
+    if datasets is None:
+        dataset_parameters = load_dataset_parameters(dataset_parameters_path) if dataset_parameters_path else None
+        datasets = create_time_series_datasets(df, data_source, time_series_config, mode, dataset_parameters)
 
-        training_dataset, validation_dataset = create_tpssep22_time_series_datasets(df, time_series_config=time_series_config, mode=mode)
-    else:
-        raise ValueError(f"[INFO] Data source {data_source} is not supported.")
+        memmap_config = data_config.get('memmap') or {}
+        if memmap_config.get('enable', False):
+            from utils.memmap_utils import MemmapTimeSeriesDataSet, create_run_memmap_dir
+
+            # Cached datasets keep their files next to their cache entry, so both are evicted together; uncached runs get a private directory
+            if cache_datasets:
+                memmap_dir = get_cache_path(cache_config['cache_dir'], f"{dataset_cache_key}_{mode}", extension='memmap')
+            else:
+                memmap_dir = create_run_memmap_dir(memmap_config['memmap_dir'])
+            datasets = tuple(
+                MemmapTimeSeriesDataSet.from_time_series_dataset(dataset, os.path.join(memmap_dir, name)) if dataset is not None else None
+                for dataset, name in zip(datasets, ('training', 'validation'))
+            )
+
+        if cache_datasets:
+            save_cached_datasets(datasets, cache_config['cache_dir'], dataset_cache_key, mode, max_size_gb=cache_config.get('max_size_gb'))
+
+    training_dataset, validation_dataset = datasets
 
     # Dataloader
     if not dataloading:
         return training_dataset, validation_dataset
     elif mode == 'train':
         # Create DataLoaders
-        train_dataloader = dataloader(training_dataset, train=True, batch_size=batch_size, num_workers=num_workers)
+        train_dataloader = dataloader(training_dataset, train=True, batch_size=batch_size, num_workers=num_workers, window_sampling=window_sampling, batch_bucketing=batch_bucketing, distributed=distributed)
         val_dataloader = dataloader(validation_dataset, train=False, batch_size=batch_size*10, num_workers=num_workers)
         return train_dataloader, val_dataloader
     elif mode == 'eval':
@@ -3,6 +3,7 @@ import lightning.pytorch as pl
 from torch.utils.data import DataLoader
 from pytorch_forecasting import TemporalFusionTransformer, Baseline
 from utils.file_utils import load_model
+from utils.execution_utils import resolve_precision, compile_model
 from utils.data_visualization import plot_predictions, interpret_model_predictions
 
 def evaluate_loss(val_dataloader: DataLoader, model: TemporalFusionTransformer = Baseline, model_name: str = "Baseline") -> dict:
@@ -42,7 +43,7 @@ def evaluate_loss(val_dataloader: DataLoader, model: TemporalFusionTransformer =
 #     predictions = model.predict(val_dataloader, return_y=True, trainer_kwargs=dict(accelerator="gpu"))
 #     print(f"[INFO] Baseline model validation results: {MAE()(predictions.output, predictions.y)}")
 
-def perform_inference(model: TemporalFusionTransformer, dataloader: DataLoader, mode: str = 'raw', return_index: bool = True, return_x: bool = True, output_dir: str = None) -> dict:
+def perform_inference(model: TemporalFusionTransformer, dataloader: DataLoader, mode: str = 'raw', return_index: bool = True, return_x: bool = True, output_dir: str = None, execution: dict = None) -> dict:
     """
     Perform inference using the trained model.
 
@@ -56,17 +57,23 @@ def perform_inference(model: TemporalFusionTransformer, dataloader: DataLoader,
     return_index (bool): Whether to return the prediction index in the same order as the output. Default is True.
     return_x (bool): Whether to return network inputs in the same order as the prediction output. Default is True.
     output_dir (str, optional): Directory to save the predictions. If None, predictions are not saved to a directory.
+    execution (dict, optional): The `training.execution` configuration with the precision and torch.compile settings. Default is None (fp32 eager).
 
     Returns:
     dict: A dictionary containing the model predictions, with additional information such as prediction index and inputs, depending on the mode.
     """
+    execution = execution or {}
+    accelerator = "gpu" if torch.cuda.is_available() else "cpu"
+    precision = resolve_precision(execution.get('precision', '32-true'), accelerator)
+    model = compile_model(model, execution.get('compile', False), execution.get('compile_mode', 'default'))
+
     return model.predict(
         dataloader, 
         mode=mode, 
         return_index=return_index,  # return the prediction index in the same order as the output
         return_x=return_x,          # return network inputs in the same order as prediction output
         output_dir=output_dir,
-        trainer_kwargs=dict(accelerator="gpu" if torch.cuda.is_available() else "cpu")
+        trainer_kwargs=dict(accelerator=accelerator, precision=precision)
     )
 
 def evaluate_pipeline(
@@ -99,7 +106,7 @@ def evaluate_pipeline(
     evaluate_loss(val_dataloader=eval_dataloader, model=model, model_name="TFT")
 
     # Perform inference
-    predictions = perform_inference(model, eval_dataloader, mode='raw', return_index=True, return_x=True)
+    predictions = perform_inference(model, eval_dataloader, mode='raw', return_index=True, return_x=True, execution=config['training'].get('execution'))
     
     # Plot predictions
     plot_predictions(predictions, model=model, save_dir=inference_dir, show_future_observed=show_future_observed, add_loss_to_title=add_loss_to_title, show=show)
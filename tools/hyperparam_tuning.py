@@ -1,14 +1,91 @@
+import os
+import copy
+import time
+import psutil
 import optuna
-import pickle
-from optuna.trial import Trial
+import multiprocessing
+from optuna.trial import Trial, TrialState
+from optuna.study import MaxTrialsCallback
+from optuna.storages import JournalStorage, JournalFileOpenLock, RDBStorage, RetryFailedTrialCallback
 from torch.utils.data import DataLoader
 from lightning.pytorch.callbacks.progress import TQDMProgressBar
-from lightning.pytorch.callbacks import EarlyStopping, LearningRateMonitor
+from lightning.pytorch.callbacks import Callback, EarlyStopping, LearningRateMonitor
 from lightning.pytorch.loggers import TensorBoardLogger
 
+try:
+    from optuna.storages.journal import JournalFileBackend
+except ImportError:  # optuna < 4.0
+    from optuna.storages import JournalFileStorage as JournalFileBackend
+
+class PruningCallback(Callback):
+    """
+    Reports the validation loss of every epoch to the Optuna trial and stops the training as soon as the pruner
+    judges the trial hopeless. The trial is marked as pruned by `objective` once the trainer has stopped.
+
+    Usage:
+    pruning_callback = PruningCallback(trial)
+    trainer = trainer_func(config, logger, None, early_stop_callback, lr_logger, progress_bar, callbacks=[pruning_callback])
+    """
+
+    def __init__(self, trial: Trial, monitor: str = 'val_loss'):
+        """
+        Parameters:
+        trial (optuna.trial.Trial): The trial to report to.
+        monitor (str): The logged metric to report. Default is 'val_loss'.
+        """
+        self.trial = trial
+        self.monitor = monitor
+        self.pruned_epoch = None
+
+    def on_validation_end(self, trainer, pl_module) -> None:
+        if trainer.sanity_checking or self.monitor not in trainer.callback_metrics:
+            return
+
+        epoch = trainer.current_epoch
+        self.trial.report(trainer.callback_metrics[self.monitor].item(), step=epoch)
+        if self.trial.should_prune():
+            self.pruned_epoch = epoch
+            trainer.should_stop = True
+
+def get_pruner(hyperparameter_tuning_config: dict) -> optuna.pruners.BasePruner:
+    """
+    Creates the pruner of the study from the `pruner` setting. The resource of a trial is its number of epochs.
+    - 'median': prunes a trial whose loss is worse than the median of earlier trials at the same epoch.
+    - 'successive_halving': keeps the best 1/`reduction_factor` of the trials at every rung of epochs.
+    - 'hyperband': runs several successive halving brackets with different minimum epochs.
+    - 'none': trials run until early stopping or `max_epochs`.
+
+    Parameters:
+    hyperparameter_tuning_config (dict): The `hyperparameter_tuning` configuration.
+
+    Usage:
+    pruner = get_pruner(config['hyperparameter_tuning'])
+
+    Returns:
+    optuna.pruners.BasePruner: The pruner.
+    """
+    pruner_config = hyperparameter_tuning_config.get('pruner') or {}
+    pruner_type = pruner_config.get('type', 'none')
+    min_resource = pruner_config.get('min_epochs', 1)
+    reduction_factor = pruner_config.get('reduction_factor', 3)
+
+    if pruner_type == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=pruner_config.get('n_startup_trials', 5), n_warmup_steps=pruner_config.get('n_warmup_epochs', 0))
+    elif pruner_type == 'successive_halving':
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=min_resource, reduction_factor=reduction_factor)
+    elif pruner_type == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=min_resource, max_resource=hyperparameter_tuning_config['max_epochs'], reduction_factor=reduction_factor)
+    elif pruner_type == 'none':
+        return optuna.pruners.NopPruner()
+    else:
+        raise ValueError(f"[ERROR] Unsupported pruner: {pruner_type}. Choose from 'median', 'successive_halving', 'hyperband' and 'none'.")
+
 def objective(trial: Trial, train_dataloader: DataLoader, val_dataloader: DataLoader, logs_dir: str, config: dict, trainer_func: callable, model_func: callable) -> float:
     """
     Objective function for Optuna hyperparameter tuning.
+    The trial trains with the epoch, batch and logging limits of the `hyperparameter_tuning` section, and records its duration,
+    CPU time, memory, epochs and worker as user attributes of the trial.
+    The validation loss of every epoch is reported to the pruner of the study, which can stop the trial early.
 
     Parameters:
     trial (optuna.trial.Trial): A trial object from Optuna for hyperparameter optimization.
@@ -22,7 +99,6 @@ def objective(trial: Trial, train_dataloader: DataLoader, val_dataloader: DataLo
     Returns:
     float: Validation loss for the trial's set of hyperparameters.
     """
-    training_config = config["training"]
     hyperparameter_tuning_config = config["hyperparameter_tuning"]
 
     # Suggest hyperparameters
@@ -31,6 +107,7 @@ def objective(trial: Trial, train_dataloader: DataLoader, val_dataloader: DataLo
     attention_head_size = trial.suggest_int("attention_head_size", *hyperparameter_tuning_config["attention_head_size_range"])
     dropout = trial.suggest_float("dropout", *hyperparameter_tuning_config["dropout_range"])
     hidden_continuous_size = trial.suggest_int("hidden_continuous_size", *hyperparameter_tuning_config["hidden_continuous_size_range"])
+    gradient_clip_val = trial.suggest_float("gradient_clip_val", *hyperparameter_tuning_config["gradient_clip_val_range"], log=True)
 
     params = {
         "learning_rate": learning_rate,
@@ -40,27 +117,139 @@ def objective(trial: Trial, train_dataloader: DataLoader, val_dataloader: DataLo
         "hidden_continuous_size": hidden_continuous_size,
     }
 
+    # Trials train with the tuning limits, in the process of their worker
+    trial_config = copy.deepcopy(config)
+    training_config = trial_config["training"]
+    for key in ('max_epochs', 'limit_train_batches', 'log_every_n_steps', 'reduce_on_plateau_patience'):
+        training_config[key] = hyperparameter_tuning_config.get(key, training_config[key])
+    training_config['gradient_clip_val'] = gradient_clip_val
+    training_config['distributed'] = {'enable': False}
+
     # Create model
-    tft = model_func(train_dataloader, params, training_config)
+    tft = model_func(train_dataloader, params, training_config, target_count=len(config['time_series']['target_vars']))
 
     # Define callbacks and logger
     early_stop_callback = EarlyStopping(monitor="val_loss", min_delta=hyperparameter_tuning_config['early_stop_min_delta'], patience=hyperparameter_tuning_config['early_stop_patience'], verbose=False, mode="min")
     lr_logger = LearningRateMonitor()
-    logger = TensorBoardLogger(save_dir=logs_dir, name="tuning_logs")
+    logger = TensorBoardLogger(save_dir=logs_dir, name="tuning_logs", version=f"trial_{trial.number}")
     progress_bar = TQDMProgressBar(refresh_rate=1)
+    pruning_callback = PruningCallback(trial)
 
     # Create trainer
-    trainer = trainer_func(config, logger, None, early_stop_callback, lr_logger, progress_bar)
+    trainer = trainer_func(trial_config, logger, None, early_stop_callback, lr_logger, progress_bar, callbacks=[pruning_callback])
 
     # Train the model
+    process = psutil.Process()
+    start, cpu_start = time.perf_counter(), sum(process.cpu_times())
     trainer.fit(tft, train_dataloader, val_dataloader)
 
+    trial.set_user_attr("duration_s", round(time.perf_counter() - start, 2))
+    trial.set_user_attr("cpu_s", round(sum(process.cpu_times()) - cpu_start, 2))
+    trial.set_user_attr("rss_mb", round(process.memory_info().rss / 1024 ** 2, 1))
+    trial.set_user_attr("epochs", trainer.current_epoch)
+    trial.set_user_attr("worker", os.getpid())
+
+    if pruning_callback.pruned_epoch is not None:
+        raise optuna.TrialPruned(f"Trial {trial.number} pruned at epoch {pruning_callback.pruned_epoch}.")
+
     # Return the validation loss
     return trainer.callback_metrics["val_loss"].item()
 
+def get_storage(hyperparameter_tuning_config: dict):
+    """
+    Creates the shared storage of the study from the `storage` setting: 'journal' for an append-only journal file that
+    any number of processes can write safely, 'sqlite' for an SQLite database, or any Optuna storage URL.
+    The files are kept in `storage_dir` under the study name.
+    Database storages record a heartbeat of every running trial every `heartbeat_interval` seconds; trials whose
+    heartbeat went stale (their worker crashed or was killed) are failed and queued again by the next worker.
+
+    Parameters:
+    hyperparameter_tuning_config (dict): The `hyperparameter_tuning` configuration.
+
+    Usage:
+    storage = get_storage(config['hyperparameter_tuning'])
+
+    Returns:
+    optuna.storages.BaseStorage: The storage.
+    """
+    storage = hyperparameter_tuning_config.get('storage', 'journal')
+    storage_dir = hyperparameter_tuning_config.get('storage_dir', './results/tuning')
+    study_name = hyperparameter_tuning_config.get('study_name', 'tft_tuning')
+
+    if storage == 'journal':
+        os.makedirs(storage_dir, exist_ok=True)
+        path = os.path.join(storage_dir, f"{study_name}.log")
+        # The open lock also works where symlinks need privileges (Windows)
+        return JournalStorage(JournalFileBackend(path, lock_obj=JournalFileOpenLock(path)))
+    elif storage == 'sqlite':
+        os.makedirs(storage_dir, exist_ok=True)
+        storage = f"sqlite:///{os.path.join(storage_dir, f'{study_name}.db')}"
+
+    heartbeat_interval = hyperparameter_tuning_config.get('heartbeat_interval')
+    if heartbeat_interval:
+        try:
+            return RDBStorage(storage, heartbeat_interval=heartbeat_interval, heartbeat_stale_trial_callback=RetryFailedTrialCallback())
+        except TypeError:  # optuna < 4.9
+            return RDBStorage(storage, heartbeat_interval=heartbeat_interval, failed_trial_callback=RetryFailedTrialCallback())
+    return optuna.storages.get_storage(storage)
+
+def recover_interrupted_trials(study: optuna.Study, storage: optuna.storages.BaseStorage) -> None:
+    """
+    Marks the trials left running by a crashed or killed sweep as failed and queues their parameters again,
+    so a resumed study reruns them. Every RUNNING trial counts as interrupted, so this is only done on request
+    (`resume_interrupted` or `main.py --resume_tuning`) while no other worker of the study is running.
+
+    Parameters:
+    study (optuna.Study): The loaded study.
+    storage (optuna.storages.BaseStorage): The storage of the study.
+    """
+    interrupted = study.get_trials(deepcopy=False, states=(TrialState.RUNNING,))
+    for trial in interrupted:
+        storage.set_trial_state_values(trial._trial_id, state=TrialState.FAIL)
+        study.enqueue_trial(trial.params, skip_if_exists=True)
+
+    if interrupted:
+        print(f"[INFO] Requeued {len(interrupted)} trials interrupted in a previous run: {[trial.number for trial in interrupted]}")
+
+def run_worker(worker_id: int, train_dataloader: DataLoader, val_dataloader: DataLoader, logs_dir: str, config: dict, trainer_func: callable, model_func: callable) -> None:
+    """
+    Runs trials of the shared study until it has `n_trials` finished trials.
+
+    Parameters:
+    worker_id (int): The index of the worker, used to seed its sampler.
+    train_dataloader (DataLoader): DataLoader for the training data.
+    val_dataloader (DataLoader): DataLoader for the validation data.
+    logs_dir (str): The directory to save logs.
+    config (dict): Dictionary containing configuration parameters.
+    trainer_func (callable): Function to create a PyTorch Lightning trainer.
+    model_func (callable): Function to initialize the Temporal Fusion Transformer model.
+    """
+    import torch
+
+    hyperparameter_tuning_config = config['hyperparameter_tuning']
+    n_workers = hyperparameter_tuning_config.get('n_workers', 1)
+    torch.set_num_threads(hyperparameter_tuning_config.get('threads_per_worker') or max(1, (os.cpu_count() or 1) // n_workers))
+
+    seed = hyperparameter_tuning_config.get('seed')
+    study = optuna.load_study(
+        study_name=hyperparameter_tuning_config.get('study_name', 'tft_tuning'),
+        storage=get_storage(hyperparameter_tuning_config),
+        sampler=optuna.samplers.TPESampler(seed=None if seed is None else seed + worker_id),
+        pruner=get_pruner(hyperparameter_tuning_config),
+    )
+    study.optimize(
+        lambda trial: objective(trial, train_dataloader, val_dataloader, logs_dir, config, trainer_func, model_func),
+        callbacks=[MaxTrialsCallback(hyperparameter_tuning_config['n_trials'], states=(TrialState.COMPLETE, TrialState.PRUNED))],
+    )
+
 def tune_hyperparameters(train_dataloader: DataLoader, val_dataloader: DataLoader, logs_dir: str, config: dict, trainer_func: callable, model_func: callable) -> dict:
     """
     Tune hyperparameters using Optuna.
+    The study lives in shared storage (see `get_storage`) and `n_workers` processes run its trials concurrently until
+    `n_trials` trials have finished. Rerunning with the same study name resumes the sweep. Interrupted trials are rerun
+    once their heartbeat goes stale (database storages) or when `resume_interrupted` is set (see `recover_interrupted_trials`).
+    The trials are exported with their durations and resource use to `tuning_trials.csv` in the logs directory.
+    Trials that the configured `pruner` stops early count towards `n_trials`.
 
     Parameters:
     train_dataloader (DataLoader): DataLoader for the training data.
@@ -73,19 +262,66 @@ def tune_hyperparameters(train_dataloader: DataLoader, val_dataloader: DataLoade
     Returns:
     dict: The best set of hyperparameters found by Optuna.
     """
-    print("[INFO] Tuning hyperparameters using Optuna...")
-    # Create an Optuna study for hyperparameter optimization
-    study = optuna.create_study(direction="minimize")
-    
+    hyperparameter_tuning_config = config['hyperparameter_tuning']
+    n_workers = hyperparameter_tuning_config.get('n_workers', 1)
+    n_trials = hyperparameter_tuning_config['n_trials']
+
+    # Create the Optuna study for hyperparameter optimization, or resume it
+    storage = get_storage(hyperparameter_tuning_config)
+    study = optuna.create_study(
+        study_name=hyperparameter_tuning_config.get('study_name', 'tft_tuning'),
+        storage=storage,
+        pruner=get_pruner(hyperparameter_tuning_config),
+        direction="minimize",
+        load_if_exists=True,
+    )
+    if hyperparameter_tuning_config.get('resume_interrupted', False):
+        recover_interrupted_trials(study, storage)
+    else:
+        running = len(study.get_trials(deepcopy=False, states=(TrialState.RUNNING,)))
+        if running and isinstance(storage, RDBStorage):
+            print(f"[INFO] The study has {running} running trials. Those whose heartbeat went stale are retried by the workers.")
+        elif running:
+            print(f"[INFO] The study has {running} running trials. They are left alone; if they were interrupted, rerun with --resume_tuning to requeue them.")
+    finished = len(study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED)))
+    print(f"[INFO] Tuning hyperparameters using Optuna: study '{study.study_name}' with {finished}/{n_trials} finished trials, {n_workers} workers")
+
     # Optimize the study
-    study.optimize(lambda trial: objective(trial, train_dataloader, val_dataloader, logs_dir, config, trainer_func, model_func))
+    first_trial, start = len(study.trials), time.perf_counter()
+    if finished >= n_trials:
+        print("[INFO] The study already has all its trials.")
+    elif n_workers == 1:
+        run_worker(0, train_dataloader, val_dataloader, logs_dir, config, trainer_func, model_func)
+    else:
+        # Forked workers share the built dataloaders instead of rebuilding them
+        context = multiprocessing.get_context(hyperparameter_tuning_config.get('start_method', 'fork'))
+        workers = [
+            context.Process(target=run_worker, args=(worker_id, train_dataloader, val_dataloader, logs_dir, config, trainer_func, model_func))
+            for worker_id in range(n_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        failed = [worker.exitcode for worker in workers if worker.exitcode != 0]
+        if failed:
+            print(f"[WARNING] {len(failed)} tuning workers exited with errors (exit codes {failed}). Rerun to resume the study.")
+    wall_time = time.perf_counter() - start
 
-    # Save the study results to a pickle file
-    with open("study.pkl", "wb") as fout:
-        pickle.dump(study, fout)
+    # Export the trials with their durations and resource use
+    trials = study.trials_dataframe()
+    trials.to_csv(os.path.join(logs_dir, "tuning_trials.csv"), index=False)
+    if 'user_attrs_duration_s' in trials:
+        trial_time = trials.loc[trials['number'] >= first_trial, 'user_attrs_duration_s'].sum()
+        print(f"[INFO] Tuning took {wall_time:.1f}s for {trial_time:.1f}s of trials ({n_workers} workers)")
+    pruned = (trials['state'] == 'PRUNED').sum()
+    print(f"[INFO] Pruned {pruned} of {len(trials)} trials.")
 
     # Get the best hyperparameters
+    if not study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)):
+        raise ValueError(f"[ERROR] The study '{study.study_name}' has no completed trial, every trial was pruned or failed. Check the logs in {logs_dir} or relax the pruner.")
     best_params = study.best_trial.params
     print(f"[INFO] Best parameters: {best_params}")
 
-    return best_params
\ No newline at end of file
+    return best_params
@@ -9,47 +9,88 @@ from lightning.pytorch.loggers import TensorBoardLogger
 from lightning.pytorch.strategies import DDPStrategy
 from pytorch_forecasting import TemporalFusionTransformer
 from pytorch_forecasting.metrics import QuantileLoss
-from tools.hyperparam_tuning import tune_hyperparameters
 from tools.eval import evaluate_pipeline
+from utils.file_utils import save_dataset_parameters
+from utils.execution_utils import resolve_precision, compile_model
 
-def create_trainer(config: dict, logger: TensorBoardLogger, checkpoint_callback: ModelCheckpoint, early_stop_callback: EarlyStopping, lr_logger: LearningRateMonitor, progress_bar: TQDMProgressBar) -> pl.Trainer:
+class SyncedTemporalFusionTransformer(TemporalFusionTransformer):
+    """
+    Temporal Fusion Transformer whose logged losses and metrics are averaged over all processes in distributed training,
+    so checkpointing, early stopping and the logs see the metrics of the whole batch instead of those of rank 0's shard.
+    Its checkpoints load with `TemporalFusionTransformer.load_from_checkpoint`.
+    """
+
+    def log(self, *args, **kwargs) -> None:
+        kwargs.setdefault('sync_dist', True)
+        super().log(*args, **kwargs)
+
+def create_trainer(config: dict, logger: TensorBoardLogger, checkpoint_callback: ModelCheckpoint, early_stop_callback: EarlyStopping, lr_logger: LearningRateMonitor, progress_bar: TQDMProgressBar, callbacks: list = None) -> pl.Trainer:
     """
     Create a PyTorch Lightning trainer with specified configuration and callbacks.
+    With `training.distributed` enabled, it trains data-parallel in `num_processes` CPU processes per node, which
+    communicate through gloo. Every process gets an equal share of the cores, the DataLoaders shard the training windows themselves,
+    and only rank 0 writes checkpoints and logs.
+    `training.execution.precision` selects the numeric precision (e.g. 'bf16-mixed'), falling back to fp32 where unsupported.
 
     Parameters:
     config (dict): Dictionary containing training configuration parameters.
     logger (TensorBoardLogger): Logger for logging training process.
-    checkpoint_callback (ModelCheckpoint): Callback for saving model checkpoints.
+    checkpoint_callback (ModelCheckpoint): Callback for saving model checkpoints. None disables checkpointing.
     early_stop_callback (EarlyStopping): Callback for early stopping.
     lr_logger (LearningRateMonitor): Callback for monitoring learning rate.
     progress_bar (TQDMProgressBar): Callback for progress bar.
+    callbacks (list, optional): Additional callbacks, e.g. for trial pruning. Default is None.
 
     Returns:
     pl.Trainer: The PyTorch Lightning trainer.
     """
     training_device = "gpu" if torch.cuda.is_available() else "cpu"
-    print(f"[INFO] Training device: {training_device}") 
-
     train_config = config['training']
+    distributed_config = train_config.get('distributed') or {}
+    execution_config = train_config.get('execution') or {}
+
+    if distributed_config.get('enable', False):
+        num_processes = distributed_config.get('num_processes', 2)
+        num_nodes = distributed_config.get('num_nodes', 1)
+        threads = distributed_config.get('threads_per_process') or max(1, (os.cpu_count() or 1) // num_processes)
+        # Set before the processes are started, so that every process inherits it
+        torch.set_num_threads(threads)
+        print(f"[INFO] Training device: cpu, {num_processes} processes x {num_nodes} nodes with {threads} threads each")
+        device_params = {
+            'accelerator': 'cpu',
+            'strategy': DDPStrategy(process_group_backend=distributed_config.get('backend', 'gloo'), start_method=distributed_config.get('start_method', 'fork')),
+            'devices': num_processes,
+            'num_nodes': num_nodes,
+            # The samplers of `dataloader` shard the training windows themselves
+            'use_distributed_sampler': False,
+        }
+    else:
+        print(f"[INFO] Training device: {training_device}")
+        device_params = {'accelerator': training_device, 'devices': 1}
 
-    callbacks = [lr_logger, checkpoint_callback, early_stop_callback, progress_bar]
+    precision = resolve_precision(execution_config.get('precision', '32-true'), device_params['accelerator'])
+    print(f"[INFO] Training precision: {precision}")
+
+    callbacks = [lr_logger, checkpoint_callback, early_stop_callback, progress_bar] + (callbacks or [])
     callbacks = [callback for callback in callbacks if callback is not None]
 
     return pl.Trainer(
         max_epochs=train_config['max_epochs'],
-        accelerator=training_device,
-        # strategy=DDPStrategy(process_group_backend="gloo"),  # For Windows users, comment out if Linux
-        devices=1,
         gradient_clip_val=train_config['gradient_clip_val'],
         limit_train_batches=train_config['limit_train_batches'],
         log_every_n_steps=train_config['log_every_n_steps'],
         callbacks=callbacks,
+        # Without a checkpoint callback, Lightning would add a default one writing into the working directory
+        enable_checkpointing=checkpoint_callback is not None,
         logger=logger,
+        precision=precision,
+        **device_params,
     )
 
 def initialize_model(train_dataloader: DataLoader, params: dict, train_config: dict, target_count: int = 1) -> TemporalFusionTransformer:
     """
     Initialize the Temporal Fusion Transformer model from dataset and parameters.
+    In distributed training, the model averages its logged metrics over the processes.
 
     Parameters:
     train_dataloader (DataLoader): DataLoader for the training data.
@@ -60,7 +101,10 @@ def initialize_model(train_dataloader: DataLoader, params: dict, train_config: d
     Returns:
     TemporalFusionTransformer: Initialized Temporal Fusion Transformer model.
     """
-    return TemporalFusionTransformer.from_dataset(
+    distributed = (train_config.get('distributed') or {}).get('enable', False)
+    model_class = SyncedTemporalFusionTransformer if distributed else TemporalFusionTransformer
+
+    return model_class.from_dataset(
         train_dataloader.dataset,
         learning_rate=params.get("learning_rate", train_config['learning_rate']),
         hidden_size=params.get("hidden_size", train_config['hidden_size']),
@@ -112,19 +156,29 @@ def training(train_dataloader: DataLoader, val_dataloader: DataLoader, best_para
     print(f"[INFO] Loaded model with {tft.size()} parameters.\n{tft}")
     print(f"[INFO] Starting training...")
 
+    execution_config = config['training'].get('execution') or {}
+    tft = compile_model(tft, execution_config.get('compile', False), execution_config.get('compile_mode', 'default'))
     trainer.fit(tft, train_dataloader, val_dataloader)
 
+    # With 'fork' or 'spawn' (distributed.start_method) only the main process returns from fit. Under torchrun every rank runs this, so only rank 0 writes files
+    if not trainer.is_global_zero:
+        return trainer
+
     best_model_path = checkpoint_callback.best_model_path
     final_best_model_path = os.path.join(training_dir, config['checkpoint']['best_model_filename'])
 
     if best_model_path:
-        torch.save(torch.load(best_model_path), final_best_model_path)
+        torch.save(torch.load(best_model_path, weights_only=False), final_best_model_path)
+
+    # Evaluation builds its dataset from the fitted normalizers and encoders instead of fitting them on the evaluation data
+    dataset_parameters_path = os.path.join(training_dir, config['checkpoint'].get('dataset_parameters_filename', 'dataset_parameters.pt'))
+    save_dataset_parameters(train_dataloader.dataset.get_parameters(), dataset_parameters_path)
 
     return trainer
 
 def train_pipeline(train_dataloader: DataLoader, val_dataloader: DataLoader, training_dir: str, checkpoint_dir: str, logs_dir: str, inference_dir: str, config: dict) -> TemporalFusionTransformer:
     """
-    Execute the training pipeline, including hyperparameter tuning and final training.
+    Execute the training pipeline, including the optional execution mode benchmark, hyperparameter tuning and final training.
 
     Parameters:
     train_dataloader (DataLoader): DataLoader for the training data.
@@ -138,12 +192,23 @@ def train_pipeline(train_dataloader: DataLoader, val_dataloader: DataLoader, tra
     Returns:
     TemporalFusionTransformer: The trained Temporal Fusion Transformer model.
     """
+    if ((config['training'].get('execution') or {}).get('benchmark') or {}).get('enable', False):
+        from tools.benchmark import benchmark_execution_modes
+        benchmark_execution_modes(train_dataloader, val_dataloader, logs_dir, config, trainer_func=create_trainer, model_func=initialize_model)
+
     if config['hyperparameter_tuning']['enable']:
+        from tools.hyperparam_tuning import tune_hyperparameters
         best_params = tune_hyperparameters(train_dataloader, val_dataloader, logs_dir, config, trainer_func=create_trainer, model_func=initialize_model)
     else:
         best_params = {}
 
+    # The gradient clipping value is a trainer setting rather than a model parameter
+    if 'gradient_clip_val' in best_params:
+        config = {**config, 'training': {**config['training'], 'gradient_clip_val': best_params['gradient_clip_val']}}
+
     trainer = training(train_dataloader, val_dataloader, best_params, training_dir, checkpoint_dir, logs_dir, config)
+    if not trainer.is_global_zero:
+        return None
 
     best_model_path = trainer.checkpoint_callback.best_model_path
     best_tft = TemporalFusionTransformer.load_from_checkpoint(best_model_path)
@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+from typing import List, Optional
+
+def compute_cache_key(data_paths: List[str], *configs: dict) -> str:
+    """
+    Computes a content-addressed cache key from the input files and configuration sections.
+    The key changes whenever a file is added, removed, resized or modified, or when any configuration value changes.
+
+    Parameters:
+    data_paths (List[str]): A list of input file paths.
+    *configs (dict): Configuration sections that influence the cached result (e.g. data and time_series).
+
+    Usage:
+    key = compute_cache_key(['data/2001.nc', 'data/2002.nc'], data_config, time_series_config)
+
+    Returns:
+    str: A hexadecimal SHA-256 digest identifying the inputs.
+    """
+    files = []
+    for path in sorted(data_paths):
+        stat = os.stat(path)
+        files.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+
+    payload = json.dumps({'files': files, 'configs': list(configs)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cache_path(cache_dir: str, key: str, extension: str = 'parquet') -> str:
+    """
+    Returns the file path of a cache entry.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    key (str): The cache key.
+    extension (str): The file extension of the entry. Default is 'parquet'.
+
+    Usage:
+    path = get_cache_path('cache', key)
+
+    Returns:
+    str: The path of the cache entry.
+    """
+    return os.path.join(cache_dir, f"{key}.{extension}")
+
+def load_cached_dataframe(cache_dir: str, key: str) -> Optional[pd.DataFrame]:
+    """
+    Loads a preprocessed DataFrame from the cache if an entry exists for the key.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    key (str): The cache key.
+
+    Usage:
+    df = load_cached_dataframe('cache', key)
+
+    Returns:
+    Optional[pd.DataFrame]: The cached DataFrame, or None on a cache miss.
+    """
+    path = get_cache_path(cache_dir, key)
+    if not os.path.exists(path):
+        print(f"[INFO] Cache miss for key {key[:12]}.")
+        return None
+
+    df = pd.read_parquet(path)
+    # Refresh the modification time so that eviction removes the least recently used entries first
+    os.utime(path)
+    print(f"[INFO] Cache hit for key {key[:12]}. Loaded {len(df)} rows from {path}")
+    return df
+
+def save_cached_dataframe(df: pd.DataFrame, cache_dir: str, key: str, max_size_gb: float = None) -> str:
+    """
+    Saves a preprocessed DataFrame to the cache in Parquet format and evicts old entries if needed.
+    The file is written to a temporary path first and then moved into place, so readers never see a partial entry.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to cache.
+    cache_dir (str): The cache directory.
+    key (str): The cache key.
+    max_size_gb (float, optional): Maximum total size of the cache in gigabytes. If None, no eviction is done.
+
+    Usage:
+    save_cached_dataframe(df, 'cache', key, max_size_gb=10)
+
+    Returns:
+    str: The path of the cache entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = get_cache_path(cache_dir, key)
+    # Per process, so concurrent runs on the same key (tuning workers, DDP ranks) never share a temporary file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Cached preprocessed DataFrame to {path}")
+
+    if max_size_gb:
+        evict_cache(cache_dir, int(max_size_gb * 1024 ** 3), keep=[path])
+
+    return path
+
+def load_cached_datasets(cache_dir: str, key: str, mode: str) -> Optional[tuple]:
+    """
+    Loads previously built TimeSeriesDataSets from the cache if an entry exists for the key and mode.
+    The entry holds the fitted normalizers, encoders and precomputed index and tensors, so no rebuild is needed.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    key (str): The cache key.
+    mode (str): Mode the datasets were built for - 'train' or 'eval'.
+
+    Usage:
+    datasets = load_cached_datasets('cache', key, mode='train')
+
+    Returns:
+    Optional[tuple]: The (training, validation) datasets, or None on a cache miss.
+    """
+    path = get_cache_path(cache_dir, f"{key}_{mode}", extension='pt')
+    if not os.path.exists(path):
+        print(f"[INFO] Dataset cache miss for key {key[:12]} ({mode}).")
+        return None
+
+    import torch
+    try:
+        datasets = torch.load(path, weights_only=False)
+    except FileNotFoundError as e:
+        # Memory-mapped datasets map their files again on load, which fails if the files were removed
+        print(f"[WARNING] Dataset cache entry {path} refers to missing files ({e}). Rebuilding the datasets.")
+        os.remove(path)
+        return None
+    os.utime(path)
+    if os.path.isdir(get_cache_path(cache_dir, f"{key}_{mode}", extension='memmap')):
+        os.utime(get_cache_path(cache_dir, f"{key}_{mode}", extension='memmap'))
+    print(f"[INFO] Dataset cache hit for key {key[:12]} ({mode}). Loaded TimeSeriesDataSets from {path}")
+    return datasets['training'], datasets['validation']
+
+def save_cached_datasets(datasets: tuple, cache_dir: str, key: str, mode: str, max_size_gb: float = None) -> str:
+    """
+    Saves built TimeSeriesDataSets to the cache and evicts old entries if needed.
+
+    Parameters:
+    datasets (tuple): The (training, validation) datasets. The training dataset is None in eval mode.
+    cache_dir (str): The cache directory.
+    key (str): The cache key.
+    mode (str): Mode the datasets were built for - 'train' or 'eval'.
+    max_size_gb (float, optional): Maximum total size of the cache in gigabytes. If None, no eviction is done.
+
+    Usage:
+    save_cached_datasets((training_dataset, validation_dataset), 'cache', key, mode='train', max_size_gb=10)
+
+    Returns:
+    str: The path of the cache entry.
+    """
+    import torch
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = get_cache_path(cache_dir, f"{key}_{mode}", extension='pt')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    training_dataset, validation_dataset = datasets
+    # Saved together so that the validation dataset keeps sharing the training dataset's fitted parameters
+    torch.save({'training': training_dataset, 'validation': validation_dataset}, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Cached TimeSeriesDataSets to {path}")
+
+    if max_size_gb:
+        evict_cache(cache_dir, int(max_size_gb * 1024 ** 3), keep=[path])
+
+    return path
+
+def get_entry_size(path: str) -> int:
+    """
+    Returns the size of a cache file, or the total size of the files in a cache directory.
+
+    Parameters:
+    path (str): The path of the file or directory.
+
+    Returns:
+    int: The size in bytes.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def evict_cache(cache_dir: str, max_bytes: int, keep: List[str] = None) -> None:
+    """
+    Removes the least recently used cache entries until the cache fits within the size limit.
+    An entry is every file and `.memmap` directory sharing a key (e.g. `<key>_train.pt` and the memory-mapped
+    files of its datasets in `<key>_train.memmap`), so they are counted and evicted together.
+    Other directories, such as the preprocessing stores, are left alone.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    max_bytes (int): Maximum total size of the cache in bytes.
+    keep (List[str], optional): Paths whose entries must not be evicted. Default is None.
+
+    Usage:
+    evict_cache('cache', max_bytes=10 * 1024 ** 3)
+    """
+    keep = {os.path.basename(path).split('.')[0] for path in (keep or [])}
+    entries = {}
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.tmp') or not (os.path.isfile(path) or name.endswith('.memmap')):
+            continue
+        entry = entries.setdefault(name.split('.')[0], {'mtime': 0, 'size': 0, 'paths': []})
+        entry['mtime'] = max(entry['mtime'], os.stat(path).st_mtime)
+        entry['size'] += get_entry_size(path)
+        entry['paths'].append(path)
+
+    total_size = sum(entry['size'] for entry in entries.values())
+    for stem, entry in sorted(entries.items(), key=lambda item: item[1]['mtime']):
+        if total_size <= max_bytes:
+            break
+        if stem in keep:
+            continue
+        for path in entry['paths']:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            print(f"[INFO] Evicted cache entry {path}")
+        total_size -= entry['size']
+
+    if total_size > max_bytes:
+        print(f"[WARNING] Cache size {total_size / 1024 ** 3:.2f} GB still exceeds the limit of {max_bytes / 1024 ** 3:.2f} GB.")
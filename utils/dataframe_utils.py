@@ -1,10 +1,14 @@
-import holidays
+import os
+import json
 import pandas as pd
-import xarray as xr
 import numpy as np
 from typing import Union
+from utils.dataset_utils import is_xarray_dataset
 
-def convert_to_dataframe(datasets: Union[xr.Dataset, pd.DataFrame], variables: list = None) -> pd.DataFrame:
+# Holiday dates per country and year, shared by all calls in this process
+_HOLIDAY_CALENDARS = {}
+
+def convert_to_dataframe(datasets: Union['xr.Dataset', pd.DataFrame], variables: list = None) -> pd.DataFrame:
     """
     Converts a combined xarray Dataset or pandas DataFrame to a pandas DataFrame, including specified variables.
 
@@ -19,7 +23,7 @@ def convert_to_dataframe(datasets: Union[xr.Dataset, pd.DataFrame], variables: l
     Returns:
     pd.DataFrame: A DataFrame containing the specified variables, with the index reset.
     """
-    if isinstance(datasets, xr.Dataset):
+    if is_xarray_dataset(datasets):
         if not variables:
             variables = list(datasets.data_vars)
 
@@ -60,6 +64,10 @@ def convert_to_datetime(df: pd.DataFrame, column: str = 'time', format: str = No
     Returns:
     pd.DataFrame: The DataFrame with the specified column converted to datetime.
     """
+    if format is None and pd.api.types.is_datetime64_any_dtype(df[column]):
+        print(f"[INFO] Column '{column}' is already in datetime format.")
+        return df
+
     try:
         if format:
             df[column] = pd.to_datetime(df[column], format=format, errors='coerce')
@@ -98,13 +106,56 @@ def convert_columns_to_string(df: pd.DataFrame, columns: list) -> pd.DataFrame:
     
     return df
 
-def convert_columns_to_float(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+def convert_columns_to_category(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """
+    Convert specified columns in a DataFrame to categoricals with string categories.
+    This is the compact alternative to `convert_columns_to_string`: only the unique values are turned into strings,
+    and each row stores a small integer code.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing the columns to convert.
+    columns (list): A list of column names to convert to categoricals.
+
+    Usage:
+    convert_columns_to_category(df, ["latitude", "longitude"])
+
+    Returns:
+    pd.DataFrame: The DataFrame with the specified columns converted to categoricals.
+    """
+    for column in columns:
+        categorical = df[column].astype('category')
+        df[column] = categorical.cat.rename_categories([str(category) for category in categorical.cat.categories])
+        print(f"[INFO] Converted column '{column}' to category.")
+    
+    return df
+
+def convert_group_columns(df: pd.DataFrame, columns: list, compact: bool = False) -> pd.DataFrame:
+    """
+    Convert group id columns to categoricals in compact mode, otherwise to strings.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing the columns to convert.
+    columns (list): A list of group column names.
+    compact (bool): Whether to use categoricals. Default is False.
+
+    Usage:
+    df = convert_group_columns(df, ["latitude", "longitude"], compact=True)
+
+    Returns:
+    pd.DataFrame: The DataFrame with the converted group columns.
+    """
+    if compact:
+        return convert_columns_to_category(df, columns)
+    return convert_columns_to_string(df, columns)
+
+def convert_columns_to_float(df: pd.DataFrame, columns: list, dtype: str = 'float64') -> pd.DataFrame:
     """
     Convert specified columns in a DataFrame to float.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing the columns to convert.
     columns (list): A list of column names to convert to float.
+    dtype (str): The float dtype to convert to. Default is 'float64'.
 
     Usage:
     df = convert_columns_to_float(df, ["num_sold"])
@@ -113,11 +164,41 @@ def convert_columns_to_float(df: pd.DataFrame, columns: list) -> pd.DataFrame:
     pd.DataFrame: The DataFrame with the specified columns converted to float.
     """
     for column in columns:
-        df[column] = df[column].astype(float)
-        print(f"[INFO] Converted column '{column}' to float.")
+        df[column] = df[column].astype(dtype)
+        print(f"[INFO] Converted column '{column}' to {dtype}.")
     
     return df
 
+def compact_dtypes(df: pd.DataFrame, time_idx_column: str = 'time_idx') -> pd.DataFrame:
+    """
+    Downcast numeric columns to compact dtypes: float64 to float32, the time index to int32,
+    and other integer columns (e.g. binary calendar flags) to the smallest integer type that holds their values.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to downcast.
+    time_idx_column (str): The name of the time index column. Default is 'time_idx'.
+
+    Usage:
+    df = compact_dtypes(df)
+
+    Returns:
+    pd.DataFrame: The DataFrame with compact dtypes.
+    """
+    memory_before = df.memory_usage(deep=True).sum()
+
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column == time_idx_column:
+            df[column] = df[column].astype('int32')
+        elif dtype == 'float64':
+            df[column] = df[column].astype('float32')
+        elif pd.api.types.is_integer_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+
+    memory_after = df.memory_usage(deep=True).sum()
+    print(f"[INFO] Compacted dtypes: {memory_before / 1024 ** 2:.1f} MB -> {memory_after / 1024 ** 2:.1f} MB")
+    return df
+
 def add_weekend_feature(df: pd.DataFrame, time_column: str, count_friday: bool = False) -> pd.DataFrame:
     """
     Add a 'weekend' column to the DataFrame. The 'weekend' column will be 1 if the day is Saturday or Sunday, and 0 otherwise.
@@ -133,64 +214,91 @@ def add_weekend_feature(df: pd.DataFrame, time_column: str, count_friday: bool =
     Example Usage:
     df = add_weekend_feature(df, 'time')
     """
-    # Ensure the time column is of datetime type
-    df[time_column] = pd.to_datetime(df[time_column])
-    
-    # Set the time column as the index
-    df.set_index(time_column, inplace=True)
-    
-    # Determine weekend starting dayofweek
-    weekend_date = 4 if count_friday else 5
+    return add_calendar_features(df, time_column, weekend=True, count_friday=count_friday)
 
-    # Add the 'weekend' column
-    df['weekend'] = (df.index.dayofweek > weekend_date).astype(int)
-    
-    # Reset the index to restore the original DataFrame structure
-    df.reset_index(inplace=True)
-    
-    return df
+def get_holiday_dates(country: str, years: list, cache_dir: str = None) -> pd.DatetimeIndex:
+    """
+    Get the holiday dates of a country for the given years.
+    Calendars are memoized per (country, year) in the process and, if a cache directory is given, in a JSON file per country,
+    so the `holidays` package is only queried once for each country and year across runs.
+
+    Parameters:
+    country (str): The country name as used by the `holidays` package (e.g. 'Belgium').
+    years (list): The years to get holidays for.
+    cache_dir (str, optional): Directory of the on-disk holiday calendar cache. Default is None (in-process only).
+
+    Usage:
+    dates = get_holiday_dates('Belgium', [2017, 2018], cache_dir='cache/holidays')
 
-def add_holidays_feature(df: pd.DataFrame, time_column: str, country_column: str) -> pd.DataFrame:
+    Returns:
+    pd.DatetimeIndex: The sorted holiday dates.
+    """
+    calendar = _HOLIDAY_CALENDARS.setdefault(country, {})
+    cache_path = os.path.join(cache_dir, f'{country}.json') if cache_dir else None
+    missing_years = [int(year) for year in years if str(year) not in calendar]
+
+    if missing_years and cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as file:
+                calendar.update(json.load(file))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Ignoring unreadable holiday cache {cache_path}: {e}. Rebuilding it.")
+        missing_years = [year for year in missing_years if str(year) not in calendar]
+
+    if missing_years:
+        import holidays
+
+        country_holidays = getattr(holidays, country)(years=missing_years)
+        for year in missing_years:
+            calendar[str(year)] = sorted(str(date) for date in country_holidays if date.year == year)
+        print(f"[INFO] Loaded {country} holidays for years {missing_years}")
+
+        if cache_path:
+            # Chunk workers may cache the same country at once, so each process writes its own temporary file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(tmp_path, 'w') as file:
+                    json.dump(calendar, file)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"[WARNING] Could not write holiday cache {cache_path}: {e}")
+
+    return pd.DatetimeIndex(sorted(date for year in years for date in calendar[str(year)]))
+
+def add_holidays_feature(df: pd.DataFrame, time_column: str, country_column: str, cache_dir: str = None) -> pd.DataFrame:
     """
     Add a 'holidays' column to the DataFrame. The 'holidays' column will be 1 if the date is a holiday in the specified country, and 0 otherwise.
+    Countries and dates are factorized into integer codes, the holiday calendar is looked up once per country,
+    and every row is matched against the resulting (country, date) holiday codes in a single vectorized pass.
 
     Parameters:
     df (pd.DataFrame): The input DataFrame containing the data.
     time_column (str): The name of the time column in the DataFrame. The time column should be of datetime type.
     country_column (str): The name of the country column in the DataFrame.
+    cache_dir (str, optional): Directory of the on-disk holiday calendar cache. Default is None.
 
     Returns:
     pd.DataFrame: The DataFrame with the added 'holidays' column.
     
     Example Usage:
-    df = add_holidays_feature(df, 'time', 'country')
+    df = add_holidays_feature(df, 'time', 'country', cache_dir='cache/holidays')
     """
     # Ensure the time column is of datetime type
     df[time_column] = pd.to_datetime(df[time_column])
-    
-    # Set the time column as the index
-    df.set_index(time_column, inplace=True)
-    
-    # Create a dictionary to store holiday dates per country
-    holidays_dates_per_country = {}
-    
-    # Get unique countries
-    unique_countries = df[country_column].unique()
-    
-    # Iterate over each country to get the holidays
-    for country in unique_countries:
-        # Get the holiday dates for the country
-        country_holidays = getattr(holidays, country)(years=set(df.index.year))
-        holidays_dates_per_country[country] = [pd.to_datetime(date) for date, _ in country_holidays.items()]
-        
-        # Mark holidays in the DataFrame
-        df.loc[df[country_column] == country, 'holidays'] = df.loc[df[country_column] == country].index.isin(holidays_dates_per_country[country])
-    
-    # Convert the 'holidays' column to integer type
-    df['holidays'] = df['holidays'].astype(int)
-    
-    # Reset the index to restore the original DataFrame structure
-    df.reset_index(inplace=True)
+
+    country_codes, countries = pd.factorize(df[country_column])
+    date_codes, dates = pd.factorize(df[time_column].dt.normalize())
+    pair_codes = country_codes.astype('int64') * len(dates) + date_codes
+
+    # (country, date) codes of every holiday that occurs in the data
+    years = sorted(set(dates.year))
+    holiday_codes = []
+    for i, country in enumerate(countries):
+        positions = dates.get_indexer(get_holiday_dates(str(country), years, cache_dir))
+        holiday_codes.append(i * len(dates) + positions[positions >= 0])
+
+    df['holidays'] = np.isin(pair_codes, np.concatenate(holiday_codes) if holiday_codes else []).astype(int)
     
     return df
 
@@ -208,23 +316,7 @@ def add_end_of_year_holidays(df: pd.DataFrame, time_column: str) -> pd.DataFrame
     Example Usage:
     df = add_end_of_year_holidays(df, 'time')
     """
-    # Ensure the time column is of datetime type
-    df[time_column] = pd.to_datetime(df[time_column])
-    
-    # Set the time column as the index
-    df.set_index(time_column, inplace=True)
-    
-    # Initialize the 'newyear' column with 0
-    df['newyear'] = 0
-    
-    # Mark end-of-year holidays
-    for day in range(25, 32):
-        df.loc[(df.index.month == 12) & (df.index.day == day), 'newyear'] = 1
-    
-    # Reset the index to restore the original DataFrame structure
-    df.reset_index(inplace=True)
-    
-    return df
+    return add_calendar_features(df, time_column, end_of_year=True)
 
 def split_year_date_hour(df: pd.DataFrame, time_column: str, new_hour_col_name: str = 'hour_id', new_date_col_name: str = 'date_id', new_year_col_name: str = 'year_id') -> pd.DataFrame:
     """
@@ -243,15 +335,14 @@ def split_year_date_hour(df: pd.DataFrame, time_column: str, new_hour_col_name:
     Returns:
     pd.DataFrame: The DataFrame with 'date', 'hour', and 'year' columns added.
     """
-    df = df.copy()
-    df.loc[:, new_date_col_name] = df[time_column].dt.date
-    df.loc[:, new_hour_col_name] = df[time_column].dt.hour
-    df.loc[:, new_year_col_name] = df[time_column].dt.year
+    df[new_date_col_name] = df[time_column].dt.date
+    df[new_hour_col_name] = df[time_column].dt.hour
+    df[new_year_col_name] = df[time_column].dt.year
 
     print(f"[INFO] Extracted 'date', 'hour', and 'year' from '{time_column}'.")
     return df
 
-def add_cyclical_calendar_features(df: pd.DataFrame, calendar_cycles: dict, time_column: str) -> pd.DataFrame:
+def add_cyclical_calendar_features(df: pd.DataFrame, calendar_cycles: dict, time_column: str, dtype: str = 'float64') -> pd.DataFrame:
     """
     Add cyclical calendar features (sine and cosine transformations) to the DataFrame.
 
@@ -259,24 +350,62 @@ def add_cyclical_calendar_features(df: pd.DataFrame, calendar_cycles: dict, time
     df (pd.DataFrame): Input DataFrame with a datetime index.
     calendar_cycles (dict): Dictionary defining the cycle lengths for different calendar features.
     time_column (str): The name of the time column in the DataFrame.
+    dtype (str): The float dtype of the added features. Default is 'float64'.
 
     Returns:
     pd.DataFrame: DataFrame with added cyclical features.
     """
-    print(f"[INFO] Adding cyclical calendar features: {list(calendar_cycles.keys())}")
-    df.set_index(time_column, inplace=True)
+    return add_calendar_features(df, time_column, calendar_cycles=calendar_cycles, dtype=dtype)
+
+def add_calendar_features(df: pd.DataFrame, time_column: str, calendar_cycles: dict = None, weekend: bool = False, count_friday: bool = False, end_of_year: bool = False, dtype: str = 'float64') -> pd.DataFrame:
+    """
+    Add all configured calendar features in one pass. The time column is factorized once, every feature is computed
+    on the unique timestamps only, and the results are broadcast to the rows through the factorized codes.
+    For gridded data, where each timestamp repeats for every cell, the cost scales with the number of timestamps rather than rows.
 
-    for feat, cycle in calendar_cycles.items():
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing the data.
+    time_column (str): The name of the time column in the DataFrame. Must not contain missing values.
+    calendar_cycles (dict, optional): Cycle lengths of the cyclical (sine and cosine) features, e.g. {"hour": 24, "week": 52}. Default is None.
+    weekend (bool): Whether to add the 'weekend' column. Default is False.
+    count_friday (bool): True if Friday counts as a weekend day. Default is False.
+    end_of_year (bool): Whether to add the 'newyear' column for December 25 to 31. Default is False.
+    dtype (str): The float dtype of the cyclical features. Default is 'float64'.
+
+    Usage:
+    df = add_calendar_features(df, 'date', {"weekday": 7, "week": 52}, weekend=True, count_friday=True, end_of_year=True)
+
+    Returns:
+    pd.DataFrame: The DataFrame with the added calendar feature columns.
+    """
+    time_codes, times = pd.factorize(df[time_column])
+    if (time_codes < 0).any():
+        raise ValueError(f"[ERROR] Column '{time_column}' contains missing values. Drop them before adding calendar features.")
+    times = pd.DatetimeIndex(pd.to_datetime(times))
+
+    features = {}
+    if calendar_cycles:
+        print(f"[INFO] Adding cyclical calendar features: {list(calendar_cycles.keys())}")
+    for feat, cycle in (calendar_cycles or {}).items():
         if feat == 'week':
-            values = df.index.isocalendar().week
+            values = times.isocalendar().week.to_numpy(dtype='float64')
         else:
-            values = getattr(df.index, feat)
-        
-        df[f"{feat}_sin"] = np.sin(2 * np.pi * values / cycle)
-        df[f"{feat}_cos"] = np.cos(2 * np.pi * values / cycle)
+            values = np.asarray(getattr(times, feat), dtype='float64')
+
+        features[f"{feat}_sin"] = np.sin(2 * np.pi * values / cycle).astype(dtype)
+        features[f"{feat}_cos"] = np.cos(2 * np.pi * values / cycle).astype(dtype)
+
+    if weekend:
+        # Determine weekend starting dayofweek
+        weekend_date = 4 if count_friday else 5
+        features['weekend'] = (times.dayofweek > weekend_date).astype(int)
+
+    if end_of_year:
+        features['newyear'] = ((times.month == 12) & (times.day >= 25)).astype(int)
+
+    for column, values in features.items():
+        df[column] = values[time_codes]
 
-    df.reset_index(inplace=True)
-    
     return df
 
 def factorize_column(df: pd.DataFrame, column: str, new_column: str) -> pd.DataFrame:
@@ -294,8 +423,7 @@ def factorize_column(df: pd.DataFrame, column: str, new_column: str) -> pd.DataF
     Returns:
     pd.DataFrame: The DataFrame with the new factorized column added.
     """
-    df = df.copy()
-    df.loc[:, new_column] = pd.factorize(df[column])[0]
+    df[new_column] = pd.factorize(df[column])[0]
     print(f"[INFO] Factorized column '{column}' into '{new_column}' with incrementing count.")
     return df
 
@@ -313,7 +441,9 @@ def drop_columns(df: pd.DataFrame, columns: list) -> pd.DataFrame:
     Returns:
     pd.DataFrame: The DataFrame with the specified column(s) dropped.
     """
-    df = df.drop(columns, axis=1)
+    # Deleting columns in place avoids building a new frame with copies of all remaining columns
+    for column in columns:
+        del df[column]
     print(f"[INFO] Dropped columns: {columns}")
     return df
 
@@ -371,27 +501,202 @@ def check_and_handle_missing_values(df: pd.DataFrame, drop: bool = False) -> pd.
     
     return df
 
-def consistency_check(df: pd.DataFrame, time_column: str = 'time_idx') -> None:
+def consistency_check(df: pd.DataFrame, time_column: str = 'time_idx', groups: list = None, max_examples: int = 5) -> dict:
     """
-    Checks for any missing value in time column of the DataFrame.
-    Time column must be in increasing index order.
+    Checks the time index for missing timesteps and duplicate rows and prints a compact report.
+    Without groups, the unique time indices of the whole DataFrame are checked for gaps.
+    With groups, rows are sorted by (group, time index) as integer arrays, and the gaps inside every group
+    and duplicate (group, time index) rows are found from the differences between neighbouring rows.
 
     Parameters:
     df (pd.DataFrame): The DataFrame to check for consistency.
+    time_column (str): The name of the integer time index column. Default is 'time_idx'.
+    groups (list, optional): The group id columns (e.g. ['latitude', 'longitude']). Default is None.
+    max_examples (int): Maximum number of gaps listed in the report. Default is 5.
 
     Usage:
-    consistency_check(df)
-    """
-    # Check for missing time indices
-    expected_time_idx = set(range(df[time_column].min(), df[time_column].max() + 1))
-    actual_time_idx = set(df[time_column].unique())
-    missing_time_idx = expected_time_idx - actual_time_idx
+    report = consistency_check(df, groups=['latitude', 'longitude'])
 
-    if missing_time_idx:
-        print(f"[DEBUG] Missing time indices: {sorted(missing_time_idx)}")
-        raise ValueError(f"Missing time indices detected: {sorted(missing_time_idx)}")
+    Returns:
+    dict: The report with the number of groups, missing timesteps, groups with gaps, duplicate rows and example gaps.
+    """
+    time_idx = df[time_column].to_numpy(dtype='int64')
+    if groups and len(df):
+        group_codes = df.groupby(groups, sort=False, observed=True).ngroup().to_numpy()
+        # Combine (group, time index) into one integer key and sort it, unless the rows are already in that order
+        offset, span = time_idx.min(), time_idx.max() - time_idx.min() + 1
+        keys = group_codes * span + (time_idx - offset)
+        if (keys[1:] >= keys[:-1]).all():
+            order = np.arange(len(keys))
+        else:
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+        group_codes, time_idx = keys // span, keys % span + offset
     else:
-        print("[DEBUG] No missing time indices detected.")
+        time_idx = np.unique(time_idx)
+        group_codes = np.zeros(len(time_idx), dtype='int64')
+        order = None
+
+    same_group = group_codes[1:] == group_codes[:-1]
+    steps = np.diff(time_idx)
+    duplicates = same_group & (steps == 0)
+    gaps = np.flatnonzero(same_group & (steps > 1))
+    missing = steps[gaps] - 1
+
+    examples = []
+    for gap in gaps[:max_examples]:
+        group = df[groups].iloc[[order[gap + 1]]].to_dict('records')[0] if groups else None
+        examples.append({'group': group, 'after': int(time_idx[gap]), 'missing': int(steps[gap] - 1)})
+
+    report = {
+        'rows': len(df),
+        'groups': int(group_codes.max()) + 1 if len(group_codes) else 0,
+        'missing_timesteps': int(missing.sum()),
+        'groups_with_gaps': len(np.unique(group_codes[gaps])),
+        'largest_gap': int(missing.max()) if len(missing) else 0,
+        'duplicates': int(duplicates.sum()),
+        'examples': examples,
+    }
+
+    if report['missing_timesteps'] or report['duplicates']:
+        print(f"[WARNING] Consistency check: {report['missing_timesteps']} missing timesteps in {report['groups_with_gaps']}/{report['groups']} groups "
+              f"(largest gap {report['largest_gap']}), {report['duplicates']} duplicate rows.")
+        for example in examples:
+            print(f"[DEBUG] Group {example['group']}: {example['missing']} missing timesteps after {time_column} {example['after']}")
+    else:
+        print(f"[DEBUG] No missing time indices or duplicates detected in {report['groups']} groups.")
+
+    return report
+
+def resolve_allow_missing_timesteps(report: dict, allow_missing_timesteps) -> bool:
+    """
+    Decides the `allow_missing_timesteps` setting of a TimeSeriesDataSet from a consistency report,
+    so that gaps and duplicates are reported before the dataset is built instead of failing inside it.
+
+    Parameters:
+    report (dict): The report returned by `consistency_check` with groups.
+    allow_missing_timesteps (bool or str): The configured value. 'auto' allows missing timesteps only if the report found gaps.
+
+    Usage:
+    allow_missing_timesteps = resolve_allow_missing_timesteps(report, time_series_config['allow_missing_timesteps'])
+
+    Returns:
+    bool: The value to pass to TimeSeriesDataSet.
+    """
+    if report['duplicates']:
+        raise ValueError(f"[ERROR] Found {report['duplicates']} duplicate rows for the same group and time index. Remove them before creating the dataset.")
+
+    has_gaps = report['missing_timesteps'] > 0
+    if allow_missing_timesteps == 'auto':
+        print(f"[INFO] Setting allow_missing_timesteps to {has_gaps} from the consistency report.")
+        return has_gaps
+
+    if has_gaps and not allow_missing_timesteps:
+        raise ValueError(f"[ERROR] Found {report['missing_timesteps']} missing timesteps in {report['groups_with_gaps']} groups, "
+                         f"but allow_missing_timesteps is False. Set it to True or 'auto', or fill the gaps.")
+    if not has_gaps and allow_missing_timesteps:
+        print("[ADVICE] No missing timesteps were found. Setting allow_missing_timesteps to False skips the gap handling.")
+
+    return bool(allow_missing_timesteps)
+
+def get_lag_feature_names(lags: dict = None, climatology: list = None) -> list:
+    """
+    Returns the names of the columns added by `add_lag_features`.
+
+    Parameters:
+    lags (dict, optional): Column name -> list of lags in time steps. Default is None.
+    climatology (list, optional): Columns with a climatology feature. Default is None.
+
+    Usage:
+    names = get_lag_feature_names({'t2m': [8758]}, ['t2m'])  # ['t2m_lag_8758', 't2m_climatology', 't2m_history_available']
+
+    Returns:
+    list: The feature column names.
+    """
+    lags, climatology = lags or {}, climatology or []
+    names = [f"{column}_lag_{lag}" for column, column_lags in lags.items() for lag in column_lags]
+    names += [f"{column}_climatology" for column in climatology]
+    return names + [f"{column}_history_available" for column in dict.fromkeys(list(lags) + climatology)]
+
+def add_lag_features(df: pd.DataFrame, groups: list, lags: dict = None, climatology: list = None, seasonal_period: int = 0, min_lag: int = 1, time_column: str = 'time_idx', dtype: str = 'float32') -> pd.DataFrame:
+    """
+    Adds long lags and seasonal climatologies of columns as compact feature columns, computed once per group
+    from (group, time index) keys instead of inside every TimeSeriesDataSet window.
+    A lag reads the value `lag` time steps earlier in the same group, so gaps are respected.
+    The climatology is the mean of the same step of the season (time index modulo `seasonal_period`) over the earlier seasons of the group.
+    Where there is no earlier value (e.g. the first season), the mean of the group's values at least `min_lag` steps earlier is used,
+    so no history has to be dropped and no feature reads a later value. The first `min_lag` steps of a group have no such values:
+    their features are 0 and the `<column>_history_available` mask is 0 there (1 elsewhere).
+    Every lag and the seasonal period must be at least `min_lag`, otherwise a feature would read targets of its own prediction window.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame with the integer time index.
+    groups (list): The group id columns (e.g. ['latitude', 'longitude']).
+    lags (dict, optional): Column name -> list of lags in time steps (e.g. {'t2m': [8758]}). Default is None.
+    climatology (list, optional): Columns to add a climatology feature for (e.g. ['t2m']). Default is None.
+    seasonal_period (int): Time steps per season (e.g. 8760 for hourly data). Required with `climatology`. Default is 0.
+    min_lag (int): The smallest allowed lag, usually the maximum prediction length. Default is 1.
+    time_column (str): The name of the integer time index column. Default is 'time_idx'.
+    dtype (str): The dtype of the feature columns. Default is 'float32'.
+
+    Usage:
+    df = add_lag_features(df, ['latitude', 'longitude'], lags={'t2m': [8758]}, climatology=['t2m'], seasonal_period=8760, min_lag=365)
+
+    Returns:
+    pd.DataFrame: The DataFrame with the `<column>_lag_<lag>`, `<column>_climatology` and `<column>_history_available` columns added.
+    """
+    lags, climatology = lags or {}, climatology or []
+    too_short = [lag for column_lags in lags.values() for lag in column_lags if lag < min_lag]
+    if too_short:
+        raise ValueError(f"[ERROR] Lag features {too_short} are shorter than the prediction length {min_lag} and would leak targets.")
+    if climatology and seasonal_period < min_lag:
+        raise ValueError(f"[ERROR] Climatology needs a seasonal period of at least the prediction length {min_lag}, got {seasonal_period}.")
+    if not len(df) or not (lags or climatology):
+        return df
+
+    time_idx = df[time_column].to_numpy(dtype='int64')
+    group_codes = df.groupby(groups, sort=False, observed=True).ngroup().to_numpy()
+
+    # Sorted (group, time index) keys, as in `consistency_check`; a lag is a lookup of key - lag
+    offset, span = time_idx.min(), time_idx.max() - time_idx.min() + 1
+    keys = group_codes * span + (time_idx - offset)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # Rows of the group at least `min_lag` steps earlier are sorted_keys[history_start:history_end]
+    history_start = np.searchsorted(sorted_keys, group_codes * span)
+    history_end = np.maximum(np.searchsorted(sorted_keys, keys - min_lag, side='right'), history_start)
+    history_count = history_end - history_start
+
+    print(f"[INFO] Adding lag features: {get_lag_feature_names(lags, climatology)}")
+    for column in dict.fromkeys(list(lags) + climatology):
+        values = df[column].to_numpy(dtype='float64')
+        # Past-only fallback: the mean of the values known when the row's prediction window starts
+        cumsum = np.r_[0.0, np.cumsum(values[order])]
+        history_means = np.where(history_count > 0, (cumsum[history_end] - cumsum[history_start]) / np.maximum(history_count, 1), 0.0)
+        df[f"{column}_history_available"] = (history_count > 0).astype(dtype)
+
+        for lag in lags.get(column, []):
+            position = np.minimum(np.searchsorted(sorted_keys, keys - lag), len(keys) - 1)
+            # Keys of the first `lag` steps of a group would otherwise point into the previous group
+            found = (sorted_keys[position] == keys - lag) & (time_idx - offset >= lag)
+            df[f"{column}_lag_{lag}"] = np.where(found, values[order[position]], history_means).astype(dtype)
+
+        if column in climatology:
+            # Running mean over the earlier seasons of every (group, step of the season) block
+            season_order = np.lexsort((time_idx, time_idx % seasonal_period, group_codes))
+            season_values = values[season_order]
+            blocks = group_codes[season_order] * seasonal_period + time_idx[season_order] % seasonal_period
+            starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]])
+            start = np.repeat(starts, np.diff(np.r_[starts, len(blocks)]))
+            cumsum = np.cumsum(season_values)
+            earlier_sum = cumsum - season_values - (cumsum[start] - season_values[start])
+            earlier_count = np.arange(len(blocks)) - start
+            means = np.empty(len(df))
+            means[season_order] = np.where(earlier_count > 0, earlier_sum / np.maximum(earlier_count, 1), history_means[season_order])
+            df[f"{column}_climatology"] = means.astype(dtype)
+
+    return df
 
 def merge_dataframes(df1: pd.DataFrame, df2: pd.DataFrame, on: str, how: str = 'inner') -> pd.DataFrame:
     """
@@ -426,4 +731,50 @@ def save_to_csv(df: pd.DataFrame, save_dir: str):
     """
     print(f'[INFO] Saving DataFrame...')
     df.to_csv(f'{save_dir}', index=False)
-    print(f"[INFO] Saved DataFrame to {save_dir}")
\ No newline at end of file
+    print(f"[INFO] Saved DataFrame to {save_dir}")
+
+def save_to_parquet(df: pd.DataFrame, save_dir: str, groups: list = None, compression: str = 'zstd', row_group_size: int = 1_000_000) -> None:
+    """
+    Saves a DataFrame to a compressed Parquet file, preserving column dtypes.
+    When group columns are given, rows are sorted by group and every row group holds whole groups only,
+    so readers can skip row groups by filtering on the group columns.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to save.
+    save_dir (str): The file path where the Parquet file should be saved.
+    groups (list, optional): Group columns used to lay out the row groups (e.g. ['latitude', 'longitude']). Default is None.
+    compression (str): Compression codec. Default is 'zstd'.
+    row_group_size (int): Target maximum number of rows per row group. Default is 1,000,000.
+
+    Usage:
+    save_to_parquet(df, 'output/data.parquet', groups=['latitude', 'longitude'])
+    """
+    print(f'[INFO] Saving DataFrame...')
+    if not groups:
+        df.to_parquet(save_dir, index=False, compression=compression, row_group_size=row_group_size)
+        print(f"[INFO] Saved DataFrame to {save_dir}")
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df.sort_values(groups, kind='stable', ignore_index=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Row offsets where a new group starts, plus the end of the table
+    group_codes = df.groupby(groups, sort=False, observed=True).ngroup().to_numpy()
+    boundaries = np.flatnonzero(np.diff(group_codes)) + 1
+    boundaries = np.append(boundaries, len(df))
+
+    row_group_count = 0
+    with pq.ParquetWriter(save_dir, table.schema, compression=compression) as writer:
+        start = 0
+        for i, end in enumerate(boundaries):
+            # Close the row group when adding the next group would exceed the target size
+            next_end = boundaries[i + 1] if i + 1 < len(boundaries) else None
+            if next_end is None or next_end - start > row_group_size:
+                writer.write_table(table.slice(start, end - start), row_group_size=end - start)
+                row_group_count += 1
+                start = end
+
+    print(f"[INFO] Saved DataFrame to {save_dir} in {row_group_count} row groups partitioned by {groups}")
@@ -1,41 +1,274 @@
-import xarray as xr
-import pandas as pd
 import os
+import sys
+import pandas as pd
+import json
+from concurrent.futures import ThreadPoolExecutor
 from utils.file_utils import get_file_paths
+from utils.cache_utils import compute_cache_key
 from typing import List, Union
 
-def load_datasets(data_paths: List[str]) -> List[Union[xr.Dataset, pd.DataFrame]]:
+
+def is_xarray_dataset(data) -> bool:
+    """
+    Checks whether data is an xarray Dataset without importing xarray, so tabular sources never load it.
+
+    Parameters:
+    data: The loaded data.
+
+    Returns:
+    bool: True for an xarray Dataset.
+    """
+    xr = sys.modules.get('xarray')
+    return xr is not None and isinstance(data, xr.Dataset)
+
+def read_file_metadata(path: str) -> dict:
+    """
+    Reads the metadata of a data file without loading its values: time range, coordinates, variables and size.
+
+    Parameters:
+    path (str): The path to the data file.
+
+    Usage:
+    metadata = read_file_metadata('data/2001.nc')
+
+    Returns:
+    dict: The file metadata. Time range and coordinates are only filled for NetCDF files.
+    """
+    stat = os.stat(path)
+    metadata = {
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'time_min': None,
+        'time_max': None,
+        'coords': {},
+        'variables': [],
+    }
+
+    if path.endswith('.nc'):
+        import xarray as xr
+
+        with xr.open_dataset(path) as ds:
+            if 'time' in ds.coords:
+                metadata['time_min'] = str(pd.Timestamp(ds['time'].values.min()))
+                metadata['time_max'] = str(pd.Timestamp(ds['time'].values.max()))
+            for name, coord in ds.coords.items():
+                if coord.ndim == 1 and name != 'time' and coord.size:
+                    metadata['coords'][name] = {'min': float(coord.values.min()), 'max': float(coord.values.max()), 'size': int(coord.size)}
+            metadata['variables'] = list(ds.data_vars)
+    elif path.endswith('.csv'):
+        metadata['variables'] = list(pd.read_csv(path, nrows=0).columns)
+    elif path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        metadata['variables'] = list(pq.read_schema(path).names)
+
+    return metadata
+
+def build_file_index(data_paths: List[str], max_workers: int = 4, index_dir: str = None) -> dict:
+    """
+    Returns the metadata of every file, reusing the persistent file index of each data directory.
+    Entries are refreshed when a file's modification time or size changed, and new entries are read concurrently
+    and written back to the index. The index of a data directory is kept in `index_dir` under a key of the directory path,
+    so read-only or shared data directories work, and it is replaced atomically so a crash never leaves a partial index.
+
+    Parameters:
+    data_paths (List[str]): A list of file paths to the data files.
+    max_workers (int): Maximum number of files read concurrently. Default is 4.
+    index_dir (str, optional): Directory of the persistent indexes, e.g. 'cache/file_index'. Default is None (not persisted).
+
+    Usage:
+    index = build_file_index(['data/2001.nc', 'data/2002.nc'], index_dir='cache/file_index')
+
+    Returns:
+    dict: A mapping of file path to file metadata.
+    """
+    paths_by_dir = {}
+    for path in data_paths:
+        paths_by_dir.setdefault(os.path.dirname(os.path.abspath(path)), []).append(path)
+
+    index = {}
+    for directory, paths in paths_by_dir.items():
+        index_path = os.path.join(index_dir, f"{compute_cache_key([], {'directory': directory})[:16]}.json") if index_dir else None
+        stored = {}
+        if index_path and os.path.exists(index_path):
+            try:
+                with open(index_path, 'r') as file:
+                    stored = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Ignoring unreadable file index {index_path}: {e}")
+
+        stale = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = stored.get(os.path.basename(path))
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                index[path] = entry
+            else:
+                stale.append(path)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for path, entry in zip(stale, executor.map(read_file_metadata, stale)):
+                    index[path] = entry
+                    stored[os.path.basename(path)] = entry
+
+        if stale and index_path:
+            # Written to a private temporary file and moved into place, so concurrent runs and crashes never leave a partial index
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(index_dir, exist_ok=True)
+                with open(tmp_path, 'w') as file:
+                    json.dump(stored, file, indent=2)
+                os.replace(tmp_path, index_path)
+                print(f"[INFO] Indexed {len(stale)} files of {directory} in {index_path}")
+            except OSError as e:
+                print(f"[WARNING] Could not write file index {index_path}: {e}")
+
+    return index
+
+def select_files(data_paths: List[str], index: dict, time_range: list = None, variables: List[str] = None) -> List[str]:
+    """
+    Selects the files that overlap the time range and contain all requested variables, based on the file index.
+
+    Parameters:
+    data_paths (List[str]): A list of file paths to the data files.
+    index (dict): A mapping of file path to file metadata, as returned by `build_file_index`.
+    time_range (list[str, str], optional): The time range to keep in format ('YYYY-MM-DD', 'YYYY-MM-DD'). Default is None.
+    variables (List[str], optional): Variables every selected file must contain. Default is None.
+
+    Usage:
+    paths = select_files(paths, index, time_range=['2019-01-01', '2019-12-31'], variables=['t2m'])
+
+    Returns:
+    List[str]: The selected file paths, in their original order.
+    """
+    start_time = pd.to_datetime(time_range[0]) if time_range else None
+    end_time = pd.to_datetime(time_range[1]) if time_range else None
+
+    selected = []
+    for path in data_paths:
+        entry = index[path]
+        if time_range and entry['time_min'] is not None:
+            if pd.Timestamp(entry['time_max']) < start_time or pd.Timestamp(entry['time_min']) > end_time:
+                print(f"[INFO] Skipping {path}: outside of time range {time_range}")
+                continue
+        if variables and entry['variables'] and not set(variables).issubset(entry['variables']):
+            print(f"[INFO] Skipping {path}: missing variables {sorted(set(variables) - set(entry['variables']))}")
+            continue
+        selected.append(path)
+
+    return selected
+
+def load_file(path: str, columns: List[str] = None, filters: list = None) -> Union['xr.Dataset', pd.DataFrame, None]:
+    """
+    Loads a single data file.
+
+    Parameters:
+    path (str): The path to the data file.
+    columns (List[str], optional): Columns to read from Parquet files. If None, all columns are read.
+    filters (list, optional): Row filters for Parquet files in pyarrow format. Default is None.
+
+    Usage:
+    ds = load_file('data/2001.nc')
+
+    Returns:
+    Union[xr.Dataset, pd.DataFrame, None]: The loaded dataset, or None for unsupported formats.
     """
-    Loads datasets from the provided file paths.
+    if path.endswith('.nc'):
+        import xarray as xr
+
+        return xr.open_dataset(path)
+    elif path.endswith('.csv'):
+        return pd.read_csv(path)
+    elif path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns, filters=filters)
+    else:
+        print(f"[WARNING] Unsupported file format for path: {path}")
+        return None
+
+def load_datasets(data_paths: List[str], columns: List[str] = None, filters: list = None, time_range: list = None, variables: List[str] = None, max_workers: int = 4, index_dir: str = None) -> List[Union['xr.Dataset', pd.DataFrame]]:
+    """
+    Loads datasets from the provided file paths, opening up to `max_workers` files concurrently.
+    A sidecar metadata index is used to skip files outside the time range or missing requested variables without opening them.
+    Parquet files are read with column and row-group pruning when columns or filters are given.
 
     Parameters:
     data_paths (List[str]): A list of file paths to the data files.
+    columns (List[str], optional): Columns to read from Parquet files. If None, all columns are read.
+    filters (list, optional): Row filters for Parquet files in pyarrow format, e.g. [('country', '==', 'Belgium')].
+                              Row groups whose statistics do not match are skipped. Default is None.
+    time_range (list[str, str], optional): Only load files overlapping this time range ('YYYY-MM-DD', 'YYYY-MM-DD'). Default is None.
+    variables (List[str], optional): Only load files containing all these variables. Default is None.
+    max_workers (int): Maximum number of files opened concurrently. Default is 4.
+    index_dir (str, optional): Directory of the persistent file indexes. Default is None (not persisted).
 
     Usage:
     datasets = load_datasets(['data/2001.nc', 'data/2002.nc', 'data/data.csv'])
+    datasets = load_datasets(['data/preprocessed.parquet'], columns=['time_idx', 'num_sold'], filters=[('country', '==', 'Belgium')])
+    datasets = load_datasets(['data/2001.nc', 'data/2002.nc'], time_range=['2002-01-01', '2002-12-31'], variables=['t2m'], max_workers=8)
 
     Returns:
     List[Union[xr.Dataset, pd.DataFrame]]: A list of xarray datasets or pandas dataframes.
     """
     if not data_paths:
         raise ValueError("[INFO] The data file path is empty.")
-    
+
+    index = build_file_index(data_paths, max_workers=max_workers, index_dir=index_dir)
+    data_paths = select_files(data_paths, index, time_range=time_range, variables=variables)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = list(executor.map(lambda path: load_file(path, columns=columns, filters=filters), data_paths))
+
     datasets = []
-    for path in data_paths:
-        if path.endswith('.nc'):
-            ds = xr.open_dataset(path)
-            datasets.append(ds)
-            print(f"[INFO] Loaded dataset time range: {ds.time.min().values} to {ds.time.max().values}")
-        elif path.endswith('.csv'):
-            df = pd.read_csv(path)
-            datasets.append(df)
-            print(f"[INFO] Loaded CSV file: {path}")
+    for path, dataset in zip(data_paths, loaded):
+        if dataset is None:
+            continue
+        datasets.append(dataset)
+        entry = index[path]
+        if entry['time_min'] is not None:
+            print(f"[INFO] Loaded {path} with time range: {entry['time_min']} to {entry['time_max']}")
         else:
-            print(f"[WARNING] Unsupported file format for path: {path}")
+            print(f"[INFO] Loaded {path} ({len(dataset)} rows)" if isinstance(dataset, pd.DataFrame) else f"[INFO] Loaded {path}")
     
     return datasets
 
-def concatenate_datasets(datasets: List[Union[xr.Dataset, pd.DataFrame]], dim: str = 'time') -> Union[xr.Dataset, pd.DataFrame]:
+def open_lazy_dataset(data_paths: List[str], dim: str = 'time', chunks: Union[dict, str] = None) -> 'xr.Dataset':
+    """
+    Opens multiple NetCDF files as a single chunked, lazily evaluated dataset.
+    Values are backed by dask arrays and are only read from disk when a later stage computes them,
+    so peak memory follows the chunk size rather than the size of the archive.
+
+    Parameters:
+    data_paths (List[str]): A list of NetCDF file paths.
+    dim (str): The dimension along which the files are combined. Default is 'time'.
+    chunks (Union[dict, str], optional): Chunk sizes per dimension (e.g. {'time': 8760}). Default is 'auto'.
+
+    Usage:
+    ds = open_lazy_dataset(['data/2001.nc', 'data/2002.nc'], chunks={'time': 8760})
+
+    Returns:
+    xr.Dataset: The combined lazy dataset.
+    """
+    if not data_paths:
+        raise ValueError("[INFO] The data file path is empty.")
+
+    import xarray as xr
+
+    ds = xr.open_mfdataset(
+        sorted(data_paths),
+        combine='nested',
+        concat_dim=dim,
+        chunks=chunks or 'auto',
+        data_vars='minimal',
+        coords='minimal',
+        compat='override',
+    )
+    print(f"[INFO] Lazily opened {len(data_paths)} files as one chunked dataset (chunks: {chunks or 'auto'}).")
+    print(f"[INFO] Loaded dataset time range: {ds[dim].min().values} to {ds[dim].max().values}")
+
+    return ds
+
+def concatenate_datasets(datasets: List[Union['xr.Dataset', pd.DataFrame]], dim: str = 'time') -> Union['xr.Dataset', pd.DataFrame]:
     """
     Concatenates a list of datasets along the specified dimension.
 
@@ -49,7 +282,9 @@ def concatenate_datasets(datasets: List[Union[xr.Dataset, pd.DataFrame]], dim: s
     Returns:
     Union[xr.Dataset, pd.DataFrame]: The concatenated dataset.
     """
-    if all(isinstance(ds, xr.Dataset) for ds in datasets):
+    if all(is_xarray_dataset(ds) for ds in datasets):
+        import xarray as xr
+
         combined_ds = xr.concat(datasets, dim=dim)
     elif all(isinstance(ds, pd.DataFrame) for ds in datasets):
         combined_ds = pd.concat(datasets, ignore_index=True)
@@ -58,7 +293,7 @@ def concatenate_datasets(datasets: List[Union[xr.Dataset, pd.DataFrame]], dim: s
     
     return combined_ds
 
-def save_dataset(dataset: Union[xr.Dataset, pd.DataFrame], save_dir: str, filename: str = 'combined_dataset.nc') -> None:
+def save_dataset(dataset: Union['xr.Dataset', pd.DataFrame], save_dir: str, filename: str = 'combined_dataset.nc') -> None:
     """
     Saves the combined dataset to the specified directory.
 
@@ -74,7 +309,7 @@ def save_dataset(dataset: Union[xr.Dataset, pd.DataFrame], save_dir: str, filena
         os.makedirs(save_dir)
     
     file_path = os.path.join(save_dir, filename)
-    if isinstance(dataset, xr.Dataset):
+    if is_xarray_dataset(dataset):
         dataset.to_netcdf(file_path)
     elif isinstance(dataset, pd.DataFrame):
         dataset.to_csv(file_path, index=False)
@@ -83,10 +318,11 @@ def save_dataset(dataset: Union[xr.Dataset, pd.DataFrame], save_dir: str, filena
     
     print(f"[INFO] Dataset saved to {file_path}")
 
-def get_combined_dataset(data_root: str, dim: str = 'time', save_dir: str = '', file_type: str = 'nc') -> Union[xr.Dataset, pd.DataFrame]:
+def get_combined_dataset(data_root: str, dim: str = 'time', save_dir: str = '', file_type: str = 'nc', lazy: bool = False, chunks: Union[dict, str] = None, columns: List[str] = None, filters: list = None, time_range: list = None, variables: List[str] = None, max_workers: int = 4, index_dir: str = None) -> Union['xr.Dataset', pd.DataFrame]:
     """
     Loads datasets from files, concatenates them along the specified dimension, 
     and optionally saves the combined dataset to a specified directory.
+    In lazy mode, NetCDF files are opened as one chunked virtual dataset instead of being concatenated in memory.
 
     Parameters:
     data_root (str): The root directory path where the data files are stored.
@@ -94,20 +330,38 @@ def get_combined_dataset(data_root: str, dim: str = 'time', save_dir: str = '',
                               If empty, the dataset is not saved. Default is ''.
     dim (str, optional): The dimension along which to concatenate the datasets. Default is 'time'.
     file_type (str, optional): The type of files to load ('nc' for NetCDF, 'csv' for CSV). Default is 'nc'.
+    lazy (bool, optional): Whether to open NetCDF files lazily as a single chunked dataset. Default is False.
+    chunks (Union[dict, str], optional): Chunk sizes used in lazy mode (e.g. {'time': 8760}). Default is None ('auto').
+    columns (List[str], optional): Columns to read from Parquet files. Default is None (all columns).
+    filters (list, optional): Row-group filters for Parquet files in pyarrow format. Default is None.
+    time_range (list[str, str], optional): Skip files outside this time range using the file index. Default is None.
+    variables (List[str], optional): Skip files missing any of these variables using the file index. Default is None.
+    max_workers (int, optional): Maximum number of files opened concurrently. Default is 4.
+    index_dir (str, optional): Directory of the persistent file indexes (e.g. 'cache/file_index'). Default is None (not persisted).
 
     Usage:
     combined_ds = get_combined_dataset('data/yearly', save_dir='data/combined', file_type='nc')
+    lazy_ds = get_combined_dataset('data/yearly/*.nc', lazy=True, chunks={'time': 8760})
 
     Returns:
     Union[xr.Dataset, pd.DataFrame]: The combined dataset concatenated along the specified dimension.
     """
     data_paths = get_file_paths(data_root)
-    datasets = load_datasets(data_paths)
-    
-    if not datasets:
-        raise ValueError("[ERROR] No datasets were loaded. Please check your data paths.")
-    
-    combined_ds = concatenate_datasets(datasets, dim)
+
+    if lazy and data_paths and all(path.endswith('.nc') for path in data_paths):
+        index = build_file_index(data_paths, max_workers=max_workers, index_dir=index_dir)
+        data_paths = select_files(data_paths, index, time_range=time_range, variables=variables)
+        combined_ds = open_lazy_dataset(data_paths, dim=dim, chunks=chunks)
+    else:
+        if lazy:
+            print("[WARNING] Lazy loading is only supported for NetCDF files. Falling back to eager loading.")
+
+        datasets = load_datasets(data_paths, columns=columns, filters=filters, time_range=time_range, variables=variables, max_workers=max_workers, index_dir=index_dir)
+        
+        if not datasets:
+            raise ValueError("[ERROR] No datasets were loaded. Please check your data paths.")
+        
+        combined_ds = concatenate_datasets(datasets, dim)
     
     if save_dir:
         if file_type == 'nc':
@@ -0,0 +1,79 @@
+import torch
+
+def resolve_precision(precision: str = '32-true', accelerator: str = 'cpu') -> str:
+    """
+    Checks that the configured Lightning precision works on the accelerator and falls back to full fp32 otherwise.
+    bf16 autocast is probed with the op types the Temporal Fusion Transformer uses (linear, LSTM, attention).
+
+    Parameters:
+    precision (str): The configured precision, e.g. '32-true' or 'bf16-mixed'. Default is '32-true'.
+    accelerator (str): The Lightning accelerator, 'cpu' or 'gpu'. Default is 'cpu'.
+
+    Usage:
+    precision = resolve_precision('bf16-mixed', accelerator='cpu')
+
+    Returns:
+    str: The precision to pass to the trainer.
+    """
+    precision = str(precision or '32-true')
+    if not precision.startswith('bf16'):
+        return precision
+
+    device = 'cuda' if accelerator == 'gpu' else 'cpu'
+    try:
+        with torch.no_grad(), torch.autocast(device_type=device, dtype=torch.bfloat16):
+            x = torch.ones(2, 3, 4, device=device)
+            x = torch.nn.Linear(4, 4).to(device)(x)
+            x, _ = torch.nn.LSTM(4, 4, batch_first=True).to(device)(x)
+            torch.nn.MultiheadAttention(4, 1, batch_first=True).to(device)(x, x, x)
+    except (RuntimeError, TypeError) as e:
+        print(f"[WARNING] {precision} is not supported on {accelerator} ({e}). Falling back to 32-true.")
+        return '32-true'
+
+    return precision
+
+def compile_model(model: torch.nn.Module, enable: bool = False, mode: str = 'default') -> torch.nn.Module:
+    """
+    Compiles the forward pass of a model in place with torch.compile. The model keeps its class, so Lightning
+    and `predict` use it as before. If the forward pass fails to compile (a dynamo or inductor error), the model falls back
+    to running eagerly instead of failing the run, and it stays eager if torch.compile is unavailable. Any other error is raised.
+
+    Parameters:
+    model (torch.nn.Module): The model, e.g. a TemporalFusionTransformer.
+    enable (bool): Whether to compile. Default is False.
+    mode (str): The torch.compile mode: 'default', 'reduce-overhead' or 'max-autotune'. Default is 'default'.
+
+    Usage:
+    tft = compile_model(tft, enable=True)
+
+    Returns:
+    torch.nn.Module: The model.
+    """
+    if not enable:
+        return model
+
+    eager_forward = model.forward
+    try:
+        compiled_forward = torch.compile(eager_forward, mode=mode)
+    except (RuntimeError, ImportError, AttributeError) as e:
+        print(f"[WARNING] torch.compile is unavailable ({e}). Running eagerly.")
+        return model
+
+    from torch._dynamo.exc import TorchDynamoException, TorchRuntimeError
+    from torch._inductor.exc import CppCompileError
+
+    def forward(*args, **kwargs):
+        # Compilation happens on the first calls, so its errors only surface here. Errors of the model itself
+        # (out of memory, shape mismatches, dynamo's TorchRuntimeError while tracing) are raised as usual
+        try:
+            return compiled_forward(*args, **kwargs)
+        except TorchRuntimeError:
+            raise
+        except (TorchDynamoException, CppCompileError) as e:
+            print(f"[WARNING] The model forward pass failed to compile ({e}). Running eagerly.")
+            model.forward = eager_forward
+            return eager_forward(*args, **kwargs)
+
+    model.forward = forward
+    print(f"[INFO] Compiled the model forward pass (mode: {mode}).")
+    return model
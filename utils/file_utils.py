@@ -1,10 +1,7 @@
 import glob
 import os
 import yaml
-import torch
 from datetime import datetime
-from pytorch_forecasting import TemporalFusionTransformer
-from pytorch_forecasting.data import TimeSeriesDataSet
 
 def get_file_paths(path: str) -> list:
     """
@@ -127,7 +124,7 @@ def dump_config(config: dict, path: str) -> None:
     with open(path, 'w') as file:
         yaml.dump(config, file)
 
-def load_model(model_path: str, dataset: TimeSeriesDataSet = None) -> TemporalFusionTransformer:
+def load_model(model_path: str, dataset: 'TimeSeriesDataSet' = None) -> 'TemporalFusionTransformer':
     """
     Load the Temporal Fusion Transformer model from a checkpoint, .pt or .pth file.
 
@@ -138,6 +135,9 @@ def load_model(model_path: str, dataset: TimeSeriesDataSet = None) -> TemporalFu
     Returns:
     TemporalFusionTransformer: The loaded Temporal Fusion Transformer model.
     """
+    import torch
+    from pytorch_forecasting import TemporalFusionTransformer
+
     print(f"[INFO] Loading model from {model_path}")
     if model_path.endswith('.ckpt'):
         return TemporalFusionTransformer.load_from_checkpoint(model_path)
@@ -148,4 +148,69 @@ def load_model(model_path: str, dataset: TimeSeriesDataSet = None) -> TemporalFu
         model.load_state_dict(torch.load(model_path))
         return model
     else:
-        raise ValueError("{DEBUG] Unsupported file format. Supported formats are: .ckpt, .pt, .pth")
\ No newline at end of file
+        raise ValueError("{DEBUG] Unsupported file format. Supported formats are: .ckpt, .pt, .pth")
+
+def save_dataset_parameters(parameters: dict, path: str) -> None:
+    """
+    Saves the parameters of a fitted TimeSeriesDataSet, including its target normalizer, categorical encoders and scalers.
+
+    Parameters:
+    parameters (dict): The dataset parameters from `TimeSeriesDataSet.get_parameters()`.
+    path (str): Path to save the parameters to.
+
+    Usage:
+    save_dataset_parameters(training_dataset.get_parameters(), 'results/trainings/20240101_000000/dataset_parameters.pt')
+    """
+    import torch
+
+    tmp_path = f"{path}.tmp"
+    torch.save(parameters, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Saved fitted dataset parameters to {path}")
+
+def load_dataset_parameters(path: str) -> dict:
+    """
+    Loads the parameters of a fitted TimeSeriesDataSet from a parameters file or from the `dataset_parameters` entry of a model checkpoint.
+
+    Parameters:
+    path (str): Path to a parameters file or a .ckpt file.
+
+    Usage:
+    parameters = load_dataset_parameters('results/trainings/20240101_000000/dataset_parameters.pt')
+
+    Returns:
+    dict: The dataset parameters, usable with `TimeSeriesDataSet.from_parameters`.
+    """
+    import torch
+
+    parameters = torch.load(path, map_location='cpu', weights_only=False)
+    if path.endswith('.ckpt'):
+        parameters = parameters.get('dataset_parameters')
+        if parameters is None:
+            raise ValueError(f"[ERROR] Checkpoint {path} does not contain dataset parameters.")
+    print(f"[INFO] Loaded fitted dataset parameters from {path}")
+    return parameters
+
+def find_dataset_parameters(model_path: str, filename: str = 'dataset_parameters.pt') -> str:
+    """
+    Finds the dataset parameters saved by the training run of a model.
+    The parameters file is searched next to the model and in its parent directory (for models in the checkpoint subdirectory).
+    Lightning checkpoints embed the parameters too, so a .ckpt model is used as a fallback.
+
+    Parameters:
+    model_path (str): Path to the model file.
+    filename (str): File name of the parameters file. Default is 'dataset_parameters.pt'.
+
+    Usage:
+    parameters_path = find_dataset_parameters('results/trainings/20240101_000000/best_model.ckpt')
+
+    Returns:
+    str: Path to the parameters, or None if there are none.
+    """
+    model_dir = os.path.dirname(os.path.abspath(model_path))
+    for directory in (model_dir, os.path.dirname(model_dir)):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+
+    return model_path if model_path.endswith('.ckpt') else None
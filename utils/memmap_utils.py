@@ -0,0 +1,137 @@
+import os
+import json
+import atexit
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import torch
+from pytorch_forecasting import TimeSeriesDataSet
+
+def create_run_memmap_dir(memmap_root: str) -> str:
+    """
+    Creates a memmap directory private to this run, so concurrent runs never overwrite each other's files.
+    The directory is removed when the process that created it exits.
+
+    Parameters:
+    memmap_root (str): The configured memmap directory.
+
+    Usage:
+    memmap_dir = create_run_memmap_dir('cache/memmap')
+
+    Returns:
+    str: The path of the new directory.
+    """
+    os.makedirs(memmap_root, exist_ok=True)
+    memmap_dir = tempfile.mkdtemp(prefix='run-', dir=memmap_root)
+    owner = os.getpid()
+    # Forked workers and DDP processes inherit the handler, but only the creating process removes the files
+    atexit.register(lambda: os.getpid() == owner and shutil.rmtree(memmap_dir, ignore_errors=True))
+    return memmap_dir
+
+class MemmapTimeSeriesDataSet(TimeSeriesDataSet):
+    """
+    TimeSeriesDataSet whose encoded feature/target tensors and window index are backed by memory-mapped .npy files.
+
+    The arrays are mapped copy-on-write from disk, so every DataLoader worker reads the same page cache instead of
+    holding its own copy, and `__getitem__` slices encoder/decoder windows straight out of the mapping.
+    When pickled (spawned workers, dataset caching) only the directory is stored and the files are mapped again on load;
+    unpickling raises FileNotFoundError if the directory was removed.
+
+    Usage:
+    training_dataset = MemmapTimeSeriesDataSet.from_time_series_dataset(training_dataset, 'cache/memmap/training')
+    """
+
+    @classmethod
+    def from_time_series_dataset(cls, dataset: TimeSeriesDataSet, directory: str) -> 'MemmapTimeSeriesDataSet':
+        """
+        Write the tensors and window index of a built TimeSeriesDataSet to memory-mapped files and return a dataset reading from them.
+        All fitted encoders, normalizers and parameters are carried over, so it can be passed to
+        `TemporalFusionTransformer.from_dataset` and `to_dataloader` like the original dataset.
+
+        Parameters:
+        dataset (TimeSeriesDataSet): The built dataset.
+        directory (str): Directory for the memory-mapped files. Existing files are overwritten.
+
+        Returns:
+        MemmapTimeSeriesDataSet: The memory-mapped dataset.
+        """
+        memmap_dataset = cls.__new__(cls)
+        memmap_dataset.__dict__.update(dataset.__dict__)
+        memmap_dataset.memmap_dir = directory
+        memmap_dataset._write_memmaps()
+        memmap_dataset._open_memmaps()
+        print(f"[INFO] Memory-mapped dataset with {len(memmap_dataset)} samples to {directory}")
+        return memmap_dataset
+
+    def _write_memmaps(self) -> None:
+        os.makedirs(self.memmap_dir, exist_ok=True)
+        layout = {'data': {}, 'index': list(self.index.columns)}
+
+        for key, value in self.data.items():
+            if value is None:
+                layout['data'][key] = None
+            elif isinstance(value, (list, tuple)):
+                layout['data'][key] = len(value)
+                for i, tensor in enumerate(value):
+                    np.save(os.path.join(self.memmap_dir, f"{key}_{i}.npy"), tensor.numpy())
+            else:
+                layout['data'][key] = -1
+                np.save(os.path.join(self.memmap_dir, f"{key}.npy"), value.numpy())
+
+        # Columns are stored by position since the predict-mode index can contain duplicate column names.
+        # Integer columns of one dtype are stored as a single (column, row) array that backs the index without a copy
+        if self.index.dtypes.nunique() == 1:
+            layout['index_array'] = True
+            np.save(os.path.join(self.memmap_dir, "index.npy"), np.ascontiguousarray(self.index.to_numpy().T))
+        else:
+            layout['index_array'] = False
+            for i in range(self.index.shape[1]):
+                np.save(os.path.join(self.memmap_dir, f"index_{i}.npy"), self.index.iloc[:, i].to_numpy())
+        np.save(os.path.join(self.memmap_dir, "index_labels.npy"), self.index.index.to_numpy())
+
+        with open(os.path.join(self.memmap_dir, 'layout.json'), 'w') as file:
+            json.dump(layout, file)
+
+    def _open_memmaps(self) -> None:
+        def load(name):
+            # Copy-on-write mapping: pages are shared between processes and only copied if modified
+            return torch.from_numpy(np.load(os.path.join(self.memmap_dir, f"{name}.npy"), mmap_mode='c'))
+
+        with open(os.path.join(self.memmap_dir, 'layout.json'), 'r') as file:
+            layout = json.load(file)
+
+        data = {}
+        for key, kind in layout['data'].items():
+            if kind is None:
+                data[key] = None
+            elif kind == -1:
+                data[key] = load(key)
+            else:
+                data[key] = [load(f"{key}_{i}") for i in range(kind)]
+        self.data = data
+
+        labels = np.load(os.path.join(self.memmap_dir, "index_labels.npy"))
+        if layout.get('index_array', False):
+            # A single block: pandas keeps the transposed mapping as its values
+            values = np.load(os.path.join(self.memmap_dir, "index.npy"), mmap_mode='c')
+            index = pd.DataFrame(values.T, index=labels, copy=False)
+        else:
+            index = pd.concat(
+                [pd.Series(np.load(os.path.join(self.memmap_dir, f"index_{i}.npy"), mmap_mode='c'), copy=False) for i in range(len(layout['index']))],
+                axis=1,
+                copy=False,
+            )
+            index.index = labels
+        index.columns = layout['index']
+        self.index = index
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['data'] = None
+        state['index'] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._open_memmaps()
@@ -0,0 +1,84 @@
+import time
+import inspect
+import psutil
+import pandas as pd
+from typing import Callable, List, Union
+from utils.dataframe_utils import convert_to_datetime, check_and_handle_missing_values, add_calendar_features, add_holidays_feature, convert_columns_to_float, convert_columns_to_string, convert_columns_to_category, convert_group_columns, split_year_date_hour, factorize_column, drop_columns, compact_dtypes, add_lag_features
+
+# Step name -> function taking a DataFrame as first argument and returning the processed DataFrame
+PREPROCESSING_STEPS = {
+    'convert_to_datetime': convert_to_datetime,
+    'check_and_handle_missing_values': check_and_handle_missing_values,
+    'add_calendar_features': add_calendar_features,
+    'add_holidays_feature': add_holidays_feature,
+    'convert_columns_to_float': convert_columns_to_float,
+    'convert_columns_to_string': convert_columns_to_string,
+    'convert_columns_to_category': convert_columns_to_category,
+    'convert_group_columns': convert_group_columns,
+    'split_year_date_hour': split_year_date_hour,
+    'factorize_column': factorize_column,
+    'drop_columns': drop_columns,
+    'compact_dtypes': compact_dtypes,
+    'add_lag_features': add_lag_features,
+}
+
+def register_step(name: str, function: Callable) -> None:
+    """
+    Registers a dataset-specific preprocessing step so it can be referenced by name in the configuration.
+
+    Parameters:
+    name (str): The step name used in `preprocessing_steps`.
+    function (Callable): Function taking a DataFrame as first argument and returning the processed DataFrame.
+
+    Usage:
+    register_step('filter_dataframe', filter_dataframe)
+    """
+    PREPROCESSING_STEPS[name] = function
+
+def run_steps(df: pd.DataFrame, steps: List[Union[str, dict]], context: dict = None, label: str = 'Preprocessing') -> pd.DataFrame:
+    """
+    Runs a declarative list of preprocessing steps in order, handing the same DataFrame from step to step,
+    and prints the wall time, rows in/out and process memory delta of every step.
+
+    Each step is either a step name or a single-key mapping of the step name to its parameters.
+    Parameters not given in the step are filled in from the context when the step function accepts them,
+    so shared settings such as `time_column` or `dtype` don't have to be repeated for every step.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to preprocess.
+    steps (List[Union[str, dict]]): The steps, e.g. ['add_calendar_features', {'drop_columns': {'columns': ['row_id']}}].
+    context (dict, optional): Default parameters shared by all steps. Default is None.
+    label (str): Name of the run used in the report. Default is 'Preprocessing'.
+
+    Usage:
+    df = run_steps(df, data_config['preprocessing_steps'], {'time_column': 'time', 'dtype': 'float32'})
+
+    Returns:
+    pd.DataFrame: The preprocessed DataFrame.
+    """
+    context = context or {}
+    process = psutil.Process()
+    report = []
+
+    for step in steps:
+        name, params = next(iter(step.items())) if isinstance(step, dict) else (step, None)
+        if name not in PREPROCESSING_STEPS:
+            raise ValueError(f"[ERROR] Unknown preprocessing step '{name}'. Available steps: {sorted(PREPROCESSING_STEPS)}")
+
+        function = PREPROCESSING_STEPS[name]
+        accepted = inspect.signature(function).parameters
+        kwargs = {key: value for key, value in context.items() if key in accepted}
+        kwargs.update(params or {})
+
+        rows_in, memory_before = len(df), process.memory_info().rss
+        start = time.perf_counter()
+        df = function(df, **kwargs)
+        elapsed = time.perf_counter() - start
+        report.append((name, elapsed, rows_in, len(df), (process.memory_info().rss - memory_before) / 1024 ** 2))
+
+    print(f"[INFO] {label} steps (wall time | rows in -> out | memory delta):")
+    for name, elapsed, rows_in, rows_out, memory_delta in report:
+        print(f"[INFO]   {name:<34} {elapsed:8.3f}s | {rows_in} -> {rows_out} | {memory_delta:+.1f} MB")
+    print(f"[INFO]   {'total':<34} {sum(entry[1] for entry in report):8.3f}s")
+
+    return df
@@ -0,0 +1,245 @@
+import numpy as np
+from typing import Iterator
+from torch.utils.data import Sampler
+from pytorch_forecasting import TimeSeriesDataSet
+
+def get_shard() -> tuple:
+    """
+    Returns the rank of this process and the number of processes in distributed training, or (0, 1) outside of it.
+
+    Usage:
+    rank, world_size = get_shard()
+
+    Returns:
+    tuple: (rank, world_size)
+    """
+    import torch.distributed as dist
+
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+def shard(items: list) -> list:
+    """
+    Returns the part of a list that belongs to this process. Every process gets the same number of items,
+    since distributed training hangs when one process runs more steps than another.
+
+    Parameters:
+    items (list): The items drawn identically on every process.
+
+    Returns:
+    list: Every world_size-th item starting at the rank, truncated to an equal share.
+    """
+    rank, world_size = get_shard()
+    return items[rank::world_size][:len(items) // world_size]
+
+class WindowSampler(Sampler):
+    """
+    Samples a fresh subset of the training windows of a TimeSeriesDataSet every epoch, so the cost of an epoch is set by
+    the configuration instead of by the number of hourly window positions.
+
+    Per epoch, windows are kept whose first time step falls on a `stride` grid with a random phase per group,
+    then at most `max_samples_per_group` random windows are kept per group and at most `samples_per_epoch` overall.
+    The draws depend on the seed and the epoch, so every window is reachable over epochs and runs are reproducible.
+    In distributed training every process draws the same windows and iterates its own equal shard of them.
+
+    Usage:
+    sampler = WindowSampler(training_dataset, stride=24, max_samples_per_group=64, samples_per_epoch=50000, seed=42)
+    train_loader = training_dataset.to_dataloader(train=True, batch_size=64, sampler=sampler, shuffle=False)
+    """
+
+    def __init__(self, dataset: TimeSeriesDataSet, stride: int = 1, max_samples_per_group: int = None, samples_per_epoch: int = None, seed: int = 0, shard: bool = True):
+        """
+        Parameters:
+        dataset (TimeSeriesDataSet): The training dataset.
+        stride (int): Time steps between kept windows of a group. Default is 1 (every window).
+        max_samples_per_group (int, optional): Maximum windows per group and epoch. Default is None (no cap).
+        samples_per_epoch (int, optional): Maximum windows per epoch. Default is None (no budget).
+        seed (int): Seed of the per-epoch draws. Default is 0.
+        shard (bool): Whether to iterate only the shard of this process in distributed training. Default is True.
+        """
+        if stride < 1:
+            raise ValueError(f"[ERROR] Window stride must be at least 1, got {stride}.")
+
+        self.group_codes = np.unique(dataset.index['sequence_id'].to_numpy(), return_inverse=True)[1]
+        self.time_idx = dataset.index['time'].to_numpy()
+        self.stride = stride
+        self.max_samples_per_group = max_samples_per_group or None
+        self.samples_per_epoch = samples_per_epoch or None
+        self.seed = seed
+        self.shard = shard
+        self.epoch = 0
+        self._selection = {}
+
+        print(f"[INFO] Window sampler: {len(self)} of {len(self.time_idx)} windows per epoch (stride {stride}, "
+              f"max {self.max_samples_per_group} per group, budget {self.samples_per_epoch}).")
+
+    def select(self, epoch: int) -> np.ndarray:
+        """
+        Draws the shuffled window indices of an epoch.
+
+        Parameters:
+        epoch (int): The epoch number.
+
+        Returns:
+        np.ndarray: The dataset indices of the epoch.
+        """
+        if epoch in self._selection:
+            return self._selection[epoch]
+
+        rng = np.random.default_rng([self.seed, epoch])
+        phase = rng.integers(0, self.stride, size=self.group_codes.max() + 1)[self.group_codes]
+        selection = rng.permutation(np.flatnonzero((self.time_idx - phase) % self.stride == 0))
+
+        if self.max_samples_per_group:
+            # Keep the first windows of every group in the shuffled order
+            groups = self.group_codes[selection]
+            order = np.argsort(groups, kind='stable')
+            starts = np.flatnonzero(np.r_[True, groups[order][1:] != groups[order][:-1]])
+            rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+            selection = selection[np.sort(order[rank < self.max_samples_per_group])]
+        # The selection is shuffled, so its head is a random subset
+        if self.samples_per_epoch and len(selection) > self.samples_per_epoch:
+            selection = selection[:self.samples_per_epoch]
+
+        self._selection = {epoch: selection}
+        return selection
+
+    def __iter__(self) -> Iterator[int]:
+        selection = self.select(self.epoch)
+        self.epoch += 1
+        return iter((shard(selection) if self.shard else selection).tolist())
+
+    def __len__(self) -> int:
+        selection = self.select(self.epoch)
+        return len(shard(selection) if self.shard else selection)
+
+class BucketBatchSampler(Sampler):
+    """
+    Batches training windows with similar encoder and decoder lengths, so batches are padded to nearly their own length
+    instead of to the longest window of a random mix. Groups can be weighted by their target scale and windows by recency.
+
+    Every epoch, the windows of the base sampler (or all windows) are drawn, with replacement in proportion to their weight
+    if weighting is enabled, sorted into length buckets and cut into batches, and the batch order is shuffled.
+    In distributed training every process draws the same batches and iterates its own equal shard of them.
+
+    Usage:
+    batch_sampler = BucketBatchSampler(training_dataset, batch_size=64, bucket_width=8, weighting=['target_scale'])
+    train_loader = training_dataset.to_dataloader(train=True, batch_size=64, batch_sampler=batch_sampler)
+    """
+
+    def __init__(self, dataset: TimeSeriesDataSet, batch_size: int, sampler: Sampler = None, bucket_width: int = 1, weighting: list = None, recency_half_life: float = None, drop_last: bool = False, seed: int = 0):
+        """
+        Parameters:
+        dataset (TimeSeriesDataSet): The training dataset.
+        batch_size (int): The maximum number of windows per batch.
+        sampler (Sampler, optional): Base sampler of the windows of an epoch, e.g. a `WindowSampler` with `shard=False`. Default is None (all windows).
+        bucket_width (int): Encoder/decoder lengths that share a bucket. Default is 1 (exact lengths).
+        weighting (list, optional): Any of 'target_scale' (groups in proportion to their mean absolute target)
+            and 'recency' (windows halve in weight every `recency_half_life` time steps into the past). Default is None.
+        recency_half_life (float, optional): Half life in time steps for 'recency' weighting. Default is None.
+        drop_last (bool): Whether to drop the incomplete last batch of every bucket. Default is False.
+        seed (int): Seed of the per-epoch draws. Default is 0.
+        """
+        weighting = weighting or []
+        unknown = set(weighting) - {'target_scale', 'recency'}
+        if unknown:
+            raise ValueError(f"[ERROR] Unknown batch weighting {sorted(unknown)}. Choose from 'target_scale' and 'recency'.")
+        if 'recency' in weighting and not recency_half_life:
+            raise ValueError("[ERROR] 'recency' weighting needs a recency_half_life.")
+
+        index = dataset.index
+        sequence_length = index['sequence_length'].to_numpy()
+        last_time = dataset.data['time'][index['index_end'].to_numpy()].numpy()
+        decoder_length = np.asarray(dataset.calculate_decoder_length(last_time, sequence_length))
+        self.encoder_length = sequence_length - decoder_length
+        self.buckets = (self.encoder_length // bucket_width) * (decoder_length.max() // bucket_width + 1) + decoder_length // bucket_width
+
+        self.weights = None
+        if weighting:
+            group_codes = np.unique(index['sequence_id'].to_numpy(), return_inverse=True)[1]
+            weights = np.ones(len(index))
+            if 'target_scale' in weighting:
+                # Mean absolute (first) target per group, spread over the windows of the group
+                target = np.abs(dataset.data['target'][0].numpy().astype('float64'))
+                cumsum = np.r_[0.0, np.cumsum(target)]
+                starts = np.full(group_codes.max() + 1, len(target))
+                ends = np.zeros(group_codes.max() + 1, dtype='int64')
+                np.minimum.at(starts, group_codes, index['index_start'].to_numpy())
+                np.maximum.at(ends, group_codes, index['index_end'].to_numpy() + 1)
+                group_scales = (cumsum[ends] - cumsum[starts]) / np.maximum(ends - starts, 1)
+                weights *= (group_scales / np.bincount(group_codes))[group_codes]
+            if 'recency' in weighting:
+                window_time = index['time'].to_numpy()
+                weights *= 0.5 ** ((window_time.max() - window_time) / recency_half_life)
+            self.weights = weights
+
+        self.dataset_length = len(index)
+        self.batch_size = batch_size
+        self.sampler = sampler
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self._batches = {}
+
+        batches = self.batches(0)
+        random_batches = np.array_split(np.random.default_rng(seed).permutation(np.concatenate(batches)), len(batches))
+        print(f"[INFO] Bucketed batches: {len(batches)} batches in {len(np.unique(self.buckets))} length buckets, "
+              f"padding {self.padding(batches):.1%} of encoder steps ({self.padding(random_batches):.1%} with random batches).")
+
+    def batches(self, epoch: int) -> list:
+        """
+        Draws the batches of an epoch.
+
+        Parameters:
+        epoch (int): The epoch number.
+
+        Returns:
+        list: The batches as arrays of dataset indices.
+        """
+        if epoch in self._batches:
+            return self._batches[epoch]
+
+        rng = np.random.default_rng([self.seed, epoch])
+        indices = np.fromiter(iter(self.sampler), dtype='int64') if self.sampler is not None else np.arange(self.dataset_length)
+        if self.weights is not None:
+            probabilities = self.weights[indices] / self.weights[indices].sum()
+            indices = rng.choice(indices, size=len(indices), replace=True, p=probabilities)
+        else:
+            indices = rng.permutation(indices)
+
+        # Sort by bucket, keeping the random order inside every bucket, and cut every bucket into batches
+        indices = indices[np.argsort(self.buckets[indices], kind='stable')]
+        starts = np.flatnonzero(np.r_[True, self.buckets[indices][1:] != self.buckets[indices][:-1]])
+        batches = []
+        for bucket in np.split(indices, starts[1:]):
+            bucket_batches = [bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size)]
+            if self.drop_last and len(bucket_batches[-1]) < self.batch_size:
+                bucket_batches.pop()
+            batches.extend(bucket_batches)
+        batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        self._batches = {epoch: batches}
+        return batches
+
+    def padding(self, batches: list) -> float:
+        """
+        Returns the share of padded encoder time steps of a list of batches.
+
+        Parameters:
+        batches (list): The batches as arrays of dataset indices.
+
+        Returns:
+        float: Padded steps divided by all steps after padding.
+        """
+        lengths = [self.encoder_length[batch] for batch in batches if len(batch)]
+        padded = sum(int(length.max()) * len(length) for length in lengths)
+        return 1 - sum(int(length.sum()) for length in lengths) / max(padded, 1)
+
+    def __iter__(self) -> Iterator[list]:
+        batches = shard(self.batches(self.epoch))
+        self.epoch += 1
+        return iter([batch.tolist() for batch in batches])
+
+    def __len__(self) -> int:
+        return len(shard(self.batches(self.epoch)))
@@ -0,0 +1,251 @@
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Iterator, List
+
+def clear_store(store_dir: str) -> None:
+    """
+    Removes an on-disk store and recreates it empty.
+
+    Parameters:
+    store_dir (str): The store directory.
+
+    Usage:
+    clear_store('cache/preprocessed_store')
+    """
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+
+def list_store_parts(store_dir: str) -> List[str]:
+    """
+    Lists the part files of an on-disk store in write order.
+
+    Parameters:
+    store_dir (str): The store directory.
+
+    Usage:
+    parts = list_store_parts('cache/preprocessed_store')
+
+    Returns:
+    List[str]: The sorted part file paths.
+    """
+    return sorted(glob.glob(os.path.join(store_dir, 'part-*.parquet')))
+
+def write_store_part(df: pd.DataFrame, store_dir: str, part_id: int) -> str:
+    """
+    Writes one chunk of preprocessed rows to the store as a Parquet part file.
+
+    Parameters:
+    df (pd.DataFrame): The chunk to write.
+    store_dir (str): The store directory.
+    part_id (int): The sequence number of the part.
+
+    Usage:
+    write_store_part(chunk_df, 'cache/preprocessed_store', 0)
+
+    Returns:
+    str: The path of the written part file.
+    """
+    path = os.path.join(store_dir, f'part-{part_id:05d}.parquet')
+    df.to_parquet(path, index=False)
+    print(f"[INFO] Wrote {len(df)} rows to {path}")
+    return path
+
+def dataset_chunk_slices(ds: 'xr.Dataset', group_dims: List[str], groups_per_chunk: int) -> List[dict]:
+    """
+    Splits an xarray Dataset into chunks of whole groups (e.g. lat/lon cells) along the first group dimension.
+    The slices are plain dicts, so they can be sent to worker processes that extract their chunk themselves.
+
+    Parameters:
+    ds (xr.Dataset): The Dataset to split, ideally opened lazily.
+    group_dims (List[str]): The dimensions that identify a group (e.g. ['latitude', 'longitude']).
+    groups_per_chunk (int): Approximate number of groups per chunk.
+
+    Usage:
+    slices = dataset_chunk_slices(ds, ['latitude', 'longitude'], groups_per_chunk=256)
+    chunk_df = read_dataset_chunk(ds, slices[0])
+
+    Returns:
+    List[dict]: One {dimension: (start, stop)} dict per chunk.
+    """
+    split_dim, other_dims = group_dims[0], group_dims[1:]
+    groups_per_step = int(np.prod([ds.sizes[dim] for dim in other_dims])) if other_dims else 1
+    step = max(1, groups_per_chunk // max(1, groups_per_step))
+
+    return [{split_dim: (start, min(start + step, ds.sizes[split_dim]))} for start in range(0, ds.sizes[split_dim], step)]
+
+def read_dataset_chunk(ds: 'xr.Dataset', chunk_slice: dict) -> pd.DataFrame:
+    """
+    Materializes one chunk of `dataset_chunk_slices` as a DataFrame.
+
+    Parameters:
+    ds (xr.Dataset): The Dataset, ideally opened lazily.
+    chunk_slice (dict): A {dimension: (start, stop)} dict of `dataset_chunk_slices`.
+
+    Returns:
+    pd.DataFrame: The rows of the chunk with the index reset.
+    """
+    return ds.isel({dim: slice(start, stop) for dim, (start, stop) in chunk_slice.items()}).to_dataframe().reset_index()
+
+def iter_dataset_chunks(ds: 'xr.Dataset', group_dims: List[str], groups_per_chunk: int) -> Iterator[pd.DataFrame]:
+    """
+    Iterates over an xarray Dataset in chunks of whole groups (e.g. lat/lon cells) and yields each chunk as a DataFrame.
+    Only one chunk is materialized at a time, so a lazily opened dataset never has to fit in memory.
+
+    Parameters:
+    ds (xr.Dataset): The Dataset to iterate over, ideally opened lazily.
+    group_dims (List[str]): The dimensions that identify a group (e.g. ['latitude', 'longitude']).
+    groups_per_chunk (int): Approximate number of groups per chunk.
+
+    Usage:
+    for chunk_df in iter_dataset_chunks(ds[['t2m']], ['latitude', 'longitude'], groups_per_chunk=256):
+        ...
+
+    Returns:
+    Iterator[pd.DataFrame]: DataFrames with the index reset, one per chunk.
+    """
+    for chunk_slice in dataset_chunk_slices(ds, group_dims, groups_per_chunk):
+        yield read_dataset_chunk(ds, chunk_slice)
+
+def partition_files_by_groups(data_paths: List[str], groups: List[str], spill_dir: str, n_partitions: int, rows_per_read: int = 1_000_000) -> List[str]:
+    """
+    Splits tabular files into partitions that each hold whole groups, reading the inputs in bounded row batches.
+    Rows are assigned to a partition by hashing their group columns and appended to one Parquet spill file per partition.
+
+    Parameters:
+    data_paths (List[str]): CSV or Parquet file paths.
+    groups (List[str]): The group columns (e.g. ['country', 'store', 'product']).
+    spill_dir (str): Directory for the partition files.
+    n_partitions (int): Number of partitions.
+    rows_per_read (int): Number of rows read from the inputs at a time. Default is 1,000,000.
+
+    Usage:
+    partitions = partition_files_by_groups(['data/train.csv'], ['country', 'store', 'product'], 'cache/spill', n_partitions=16)
+
+    Returns:
+    List[str]: The paths of the non-empty partition files.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    clear_store(spill_dir)
+    writers = {}
+    schema = None
+
+    def read_batches(path):
+        if path.endswith('.csv'):
+            yield from pd.read_csv(path, chunksize=rows_per_read)
+        elif path.endswith('.parquet'):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=rows_per_read):
+                yield batch.to_pandas()
+        else:
+            print(f"[WARNING] Unsupported file format for path: {path}")
+
+    try:
+        for path in data_paths:
+            for batch in read_batches(path):
+                partition_ids = pd.util.hash_pandas_object(batch[groups], index=False).to_numpy() % n_partitions
+                table = pa.Table.from_pandas(batch, preserve_index=False)
+                # Pin the schema of the first batch so that later batches with other inferred dtypes still append
+                schema = schema or table.schema
+                table = table.cast(schema)
+
+                for partition_id in np.unique(partition_ids):
+                    if partition_id not in writers:
+                        partition_path = os.path.join(spill_dir, f'partition-{partition_id:05d}.parquet')
+                        writers[partition_id] = pq.ParquetWriter(partition_path, schema)
+                    writers[partition_id].write_table(table.filter(pa.array(partition_ids == partition_id)))
+            print(f"[INFO] Partitioned {path} into {len(writers)} group partitions.")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return sorted(os.path.join(spill_dir, f'partition-{partition_id:05d}.parquet') for partition_id in writers)
+
+def assign_store_time_idx(store_dir: str, time_column: str, new_column: str = 'time_idx', dtype: str = 'int64') -> pd.Index:
+    """
+    Assigns a global time index to every part of the store and drops the time column.
+    The unique timestamps of all parts are collected first and sorted, so every chunk maps the same timestamp to the same index.
+
+    Parameters:
+    store_dir (str): The store directory.
+    time_column (str): The name of the time column in the parts.
+    new_column (str): The name of the time index column. Default is 'time_idx'.
+    dtype (str): The integer dtype of the time index. Default is 'int64'.
+
+    Usage:
+    time_values = assign_store_time_idx('cache/preprocessed_store', 'time')
+
+    Returns:
+    pd.Index: The sorted unique timestamps; position i corresponds to time index i.
+    """
+    parts = list_store_parts(store_dir)
+    if not parts:
+        raise ValueError(f"[ERROR] The store {store_dir} is empty, so there are no timestamps to index. Check the data root and filters.")
+
+    time_values = None
+    for path in parts:
+        part_times = pd.Index(pd.read_parquet(path, columns=[time_column])[time_column].unique())
+        time_values = part_times if time_values is None else time_values.union(part_times)
+    time_values = time_values.sort_values()
+
+    for path in parts:
+        df = pd.read_parquet(path)
+        df[new_column] = time_values.get_indexer(df[time_column]).astype(dtype)
+        df = df.drop(columns=[time_column])
+        df.to_parquet(path, index=False)
+
+    print(f"[INFO] Assigned '{new_column}' across {len(parts)} parts from {len(time_values)} unique timestamps.")
+    return time_values
+
+def last_store_time_idx(store_dir: str, groups: List[str], time_idx_column: str = 'time_idx') -> pd.DataFrame:
+    """
+    Returns the last time index of every group in the store, reading only the group and time index columns.
+
+    Parameters:
+    store_dir (str): The store directory.
+    groups (List[str]): The group columns (e.g. ['latitude', 'longitude']).
+    time_idx_column (str): The name of the time index column. Default is 'time_idx'.
+
+    Usage:
+    last = last_store_time_idx('cache/incremental_store', ['latitude', 'longitude'])
+
+    Returns:
+    pd.DataFrame: One row per group with the group columns and its last time index.
+    """
+    parts = [pd.read_parquet(path, columns=groups + [time_idx_column]) for path in list_store_parts(store_dir)]
+    if not parts:
+        return pd.DataFrame(columns=groups + [time_idx_column])
+    return pd.concat(parts, ignore_index=True).groupby(groups, observed=True)[time_idx_column].max().reset_index()
+
+def load_store(store_dir: str) -> pd.DataFrame:
+    """
+    Loads all parts of the store into a single DataFrame, keeping the column order of the parts.
+    Categorical columns are merged with the union of the categories of every part.
+
+    Parameters:
+    store_dir (str): The store directory.
+
+    Usage:
+    df = load_store('cache/preprocessed_store')
+
+    Returns:
+    pd.DataFrame: The concatenated DataFrame.
+    """
+    parts = [pd.read_parquet(path) for path in list_store_parts(store_dir)]
+    if not parts:
+        raise ValueError(f"[ERROR] The store {store_dir} is empty.")
+
+    categorical_columns = [column for column, dtype in parts[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    categoricals = {column: pd.api.types.union_categoricals([part[column] for part in parts]) for column in categorical_columns}
+
+    df = pd.concat([part.drop(columns=categorical_columns) for part in parts], ignore_index=True)
+    # Insert in column order, so every categorical lands at its original position
+    for column, values in categoricals.items():
+        df.insert(parts[0].columns.get_loc(column), column, pd.Categorical(values))
+
+    print(f"[INFO] Loaded {len(df)} rows from {len(parts)} parts in {store_dir}")
+    return df